@@ -1,7 +1,16 @@
 from itertools import combinations
-from numpy import array, ones
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import heappush, heappop
+from numpy import array, empty, zeros, int64
 from abc import ABCMeta, abstractmethod
 from data_structures import *
+from spatial import SpatialGrid, LocationIndex
+
+# version of the matching semantics of the attacks: to be increased whenever a change makes the same attack on the same
+# dataset give different risks, so that risks stored by a previous version are not reused
+MATCHING_VERSION = 2
 
 
 class Attack:
@@ -9,8 +18,9 @@ class Attack:
     Abstract class for a generic attack. Defines a series of functions common to all attacks.
     """
     __metaclass__ = ABCMeta
+    signature_bits = 256
 
-    def __init__(self, k):
+    def __init__(self, k, spatial_tolerance=None):
         """
         Generic initializer for an attack.
 
@@ -20,10 +30,48 @@ class Attack:
             parameter that defines the background knowledge configuration. It represents the quantity of information
             that the adversary has. So, for example, if k = 2, the adversary will, ipothetically, know any combination
             of the visits of a users of length 2.
+        spatial_tolerance: float, optional
+            if None (default) locations are matched by exact equality of their coordinates. Otherwise it is the size of
+            the cells of a grid on which coordinates are quantized: two locations match if they fall in the same or in
+            adjacent cells, so that any two points closer than spatial_tolerance along both coordinates always match.
         """
         self.k = k
+        self.spatial_tolerance = spatial_tolerance
+        self.grid = None if spatial_tolerance is None else SpatialGrid(spatial_tolerance)
+        self.location_index = None
+        self.signatures = None
+        self.__scoped_dataset = None
+        self.__signed_dataset = None
+        self.__signed_visits = []
+
+    def describe(self):
+        """
+        Builds a name for the attack from its class and parameters, for example "VisitAttack(k=2, precision=Day)".
+        Parameters that are None or False are left out. The name identifies the configuration of the attack, see
+        _parameters.
 
-    def all_risks(self, dataset):
+        Returns
+        -------
+        name: str
+            the name of the attack.
+        """
+        parameters = [name + "=" + str(value) for name, value in self._parameters()
+                      if value is not None and value is not False]
+        return type(self).__name__ + "(" + ", ".join(parameters) + ")"
+
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, the ones given to its initializer. Attacks with their own parameters
+        should extend this, so that two attacks configured differently have different names.
+
+        Returns
+        -------
+        parameters: list[(str, object)]
+            the name and the value of each parameter.
+        """
+        return [("k", self.k), ("spatial_tolerance", self.spatial_tolerance)]
+
+    def all_risks(self, dataset, columnar=False, details=False, summary=None):
         """
         Computes privacy risk for all individuals in the dataset. Calls the risk function on all individuals.
 
@@ -31,45 +79,551 @@ class Attack:
         ----------
         dataset: numpy.array[IndividualRecord]
             the dataset on which to calculate the risk.
+        columnar: bool
+            if True, the risks are returned as numpy arrays instead of as a dictionary.
+        details: bool
+            if True, and columnar is True, also returns for each individual the instance with the highest probability of
+            reidentification and its support.
+        summary: RiskSummary, optional
+            a summary updated with the risks while they are computed.
 
         Returns
         -------
         risk: dict{int : float}
-            a dictionary with the identifier of each individual paired with her risk.
+            a dictionary with the identifier of each individual paired with her risk. If columnar is True, a dictionary
+            with the numpy arrays "id" and "risk", with one element for each record of the dataset in the same order,
+            and, if details is True, "instance" and "support".
         """
-        risks = {}
-        for individual_record in dataset:
-            risks[individual_record.id] = self.risk(dataset, individual_record)
-        return risks
+        with self._dataset_scope(dataset):
+            if not columnar:
+                risks = {}
+                for individual_record in dataset:
+                    risks[individual_record.id] = self.risk(dataset, individual_record)
+                    if summary is not None:
+                        summary.update(risks[individual_record.id])
+                return risks
+            number_of_records = len(dataset)
+            columns = {"id": array([individual_record.id for individual_record in dataset]),
+                       "risk": zeros(number_of_records, dtype=float)}
+            if details:
+                columns["instance"] = empty(number_of_records, dtype=object)
+                columns["support"] = zeros(number_of_records, dtype=int64)
+            for position, individual_record in enumerate(dataset):
+                risk, instance, support = self.best_instance(dataset, individual_record)
+                columns["risk"][position] = risk
+                if details:
+                    columns["instance"][position] = instance
+                    columns["support"][position] = support
+            if summary is not None:
+                summary.update(columns["risk"])
+            return columns
+
+    def risk_summary(self, dataset, summary):
+        """
+        Computes privacy risk for all individuals in the dataset, keeping only a summary of the risks.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+        summary: RiskSummary
+            the summary to update with the risks.
+
+        Returns
+        -------
+        summary: RiskSummary
+            the updated summary.
+        """
+        with self._dataset_scope(dataset):
+            for individual_record in dataset:
+                summary.update(self.risk(dataset, individual_record))
+            return summary
+
+    def individuals_above(self, dataset, tau):
+        """
+        Finds the individuals whose privacy risk is at least tau. The instances of each individual are tried from the
+        rarest, and the search stops at the first instance proving that her risk reaches tau, so that the exact risk
+        is not computed.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+        tau: float
+            the risk threshold.
+
+        Returns
+        -------
+        individuals: list[int]
+            the identifiers of the individuals with risk at least tau, in the order of the dataset.
+        """
+        with self._dataset_scope(dataset):
+            individuals = []
+            for individual_record in dataset:
+                for bound in self._risk_bounds(dataset, individual_record):
+                    if bound >= tau:
+                        individuals.append(individual_record.id)
+                        break
+            return individuals
+
+    def top_risky(self, dataset, K):
+        """
+        Finds the K individuals with the highest privacy risk. The instances of each individual are tried from the
+        rarest, and the search stops as soon as her risk is proven to beat the current K-th highest risk. The search is
+        resumed only if she is about to be pushed out of the K highest risks, and once K individuals with the highest
+        possible risk are found the remaining individuals are not examined.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+        K: int
+            the number of individuals to find.
+
+        Returns
+        -------
+        top: list[(int, float)]
+            the identifiers of the K individuals with the highest risk, paired with their risk, from the highest risk.
+            Among individuals with the same risk, the ones coming first in the dataset are preferred.
+        """
+        with self._dataset_scope(dataset):
+            max_risk = max(self._frequency_index(dataset).id_counts.values(), default=0)
+            heap = []
+            for order, individual_record in enumerate(dataset):
+                if K <= 0:
+                    break
+                bar = heap[0][0] if len(heap) == K else None
+                if bar is not None and bar >= max_risk:
+                    break
+                bounds = self._risk_bounds(dataset, individual_record)
+                risk = 0
+                for risk in bounds:
+                    if bar is None or risk > bar:
+                        break
+                if bar is not None and risk <= bar:
+                    continue
+                heappush(heap, (risk, False, -order, individual_record.id, bounds))
+                while len(heap) > K:
+                    risk, exact, neg_order, individual_id, bounds = heappop(heap)
+                    if exact:
+                        break
+                    for risk in bounds:
+                        pass
+                    heappush(heap, (risk, True, neg_order, individual_id, bounds))
+            top = []
+            for risk, exact, neg_order, individual_id, bounds in heap:
+                for risk in bounds:
+                    pass
+                top.append((risk, neg_order, individual_id))
+            top.sort(reverse=True)
+            return [(individual_id, risk) for risk, neg_order, individual_id in top]
+
+    def _risk_bounds(self, dataset, individual_record):
+        """
+        Generates increasing lower bounds of the risk of an individual, the last one being her exact risk. The instances
+        of the record are generated from its rarest locations, see _rarest_first, and the number of records visiting
+        the rarest location of each instance, an upper bound of its support, gives a bound before its support is
+        computed.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which to compute the privacy risk.
+        individual_record: IndividualRecord
+            the individual record of the individual of which to compute the privacy risk.
+
+        Returns
+        -------
+        bounds: generator of float
+            the lower bounds of the risk. Generation stops once the risk reaches the number of records of the
+            individual, the maximum possible risk, since the support of an instance counts at least the record it comes
+            from.
+        """
+        num_records = self._num_records(dataset, individual_record.id)
+        risk = 0
+        generated = False
+        for max_support, instance in self._rarest_first(dataset, individual_record):
+            generated = True
+            if max_support > 0 and num_records / max_support > risk:
+                yield num_records / max_support
+            support = self.support(dataset, instance)
+            risk = max(risk, num_records / support)
+            yield risk
+            if risk >= num_records:
+                return
+        if not generated:
+            yield risk
+
+    def _rarest_first(self, dataset, individual_record):
+        """
+        Generates the instances of a record starting from its rarest locations: the locations are ranked by the number
+        of records of the dataset visiting them, and the instances are generated lazily in the order of the ranks of
+        their locations, so that instances made of rare locations, the most likely to give a high risk, come first.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which to compute the privacy risk.
+        individual_record: IndividualRecord
+            the record from which to generate the instances.
+
+        Returns
+        -------
+        ordered: generator of (int, numpy.array[(x,y,i)])
+            the instances of the record, each paired with the number of records visiting its rarest location, which is
+            an upper bound of its support.
+        """
+        index = self._frequency_index(dataset)
+        frequencies = {}
+
+        def frequency(location):
+            if location not in frequencies:
+                frequencies[location] = index.frequency(*location)
+            return frequencies[location]
 
-    def __reidentification_prob( self, dataset, instance, individual_id):
+        for instance in self.instances(individual_record, frequency):
+            max_support = len(dataset)
+            for location in zip(instance["x"].tolist(), instance["y"].tolist()):
+                max_support = min(max_support, frequency(location))
+            yield max_support, instance
+
+    def _support_lower_bound(self, dataset, instance):
         """
-        Computes the probability of reidentification of a background knowledge instance. The probability of
-        reidentification is defined as the ratio between the number of records belonging to the user, and the number of
-        records matching the background knowledge instance. The matching is determined calling the matching function.
+        Computes a lower bound of the support of an instance, without matching it against the records. Instances whose
+        lower bound shows that they can not give a higher risk than the current one are skipped. Attacks with a cheap
+        bound should override this.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the support is computed.
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        lower_bound: int
+            a number of records not larger than the support of the instance, 0 if no bound is known.
+        """
+        return 0
+
+    def support(self, dataset, instance):
+        """
+        Computes the support of a background knowledge instance, i.e. the number of records of the dataset matching it.
 
         Parameters
         ----------
         dataset: numpy.array[IndividualRecord]
             the dataset against which to make the matching operations.
         instance: numpy.array[(x,y,i)]
-            the background knowledge instance on which to execute the computation.
+            the background knowledge instance of which to compute the support.
+
+        Returns
+        -------
+        support: int
+            the number of records of the dataset that match the instance.
+        """
+        index = self._candidate_index(dataset)
+        if index is not None:
+            positions = index.candidates(instance)
+        else:
+            positions = range(len(dataset))
+        self._signatures(dataset)
+        instance_signature = self._instance_signature(instance)
+        support = 0
+        for position in positions:
+            if Attack._may_match(self._signature(dataset, position), instance_signature) and \
+                    self.has_matching(dataset[position], instance):
+                support += 1
+        return support
+
+    def _num_records(self, dataset, individual_id):
+        """
+        Counts the records of the dataset belonging to an individual.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset in which to count the records.
         individual_id: int
-            the identifier of the individual owning te instance.
+            the identifier of the individual.
+
         Returns
         -------
-        reid_prob: float
-            the probability of reidentification of the background knowledge instance
+        num_records: int
+            the number of records of the individual in the dataset.
         """
-        support = 0.0
-        num_records = 0.0
+        index = self._candidate_index(dataset)
+        if index is not None:
+            return index.id_counts.get(individual_id, 0)
+        num_records = 0
         for individual_record in dataset:
-            if self.has_matching(individual_record, instance):
-                support += 1
             if individual_record.id == individual_id:
                 num_records += 1
-        reid_prob = num_records / support
-        return reid_prob
+        return num_records
+
+    def instances(self, individual_record, rank=None):
+        """
+        Generates the background knowledge instances of a record: all the combinations of k of its visits, or the
+        whole record if it has less than k visits. Combinations that are equal to one already generated are skipped,
+        since they would have the same probability of reidentification.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record from which to generate the instances.
+        rank: function, optional
+            a function giving the rank of a location (x, y). If given, the combinations are generated starting from the
+            visits to the locations with the lowest rank, otherwise in the order of the visits of the record. The visits
+            of each instance keep the order of the record.
+
+        Returns
+        -------
+        instances: generator of numpy.array[(x,y,i)]
+            the background knowledge instances, with the same type of the visits of the record.
+        """
+        visits = individual_record.visits
+        positions = range(len(visits))
+        if rank is not None:
+            locations = list(zip(visits["x"].tolist(), visits["y"].tolist()))
+            positions = sorted(positions, key=lambda position: rank(locations[position]))
+        seen = set()
+        for combination in combinations(positions, self._instance_size(individual_record)):
+            instance = visits[sorted(combination)]
+            key = instance.tobytes()
+            if key not in seen:
+                seen.add(key)
+                yield instance
+
+    def _instance_size(self, individual_record):
+        """
+        Returns the number of visits of the instances of a record: k, or the number of visits of the record if it has
+        less than k visits.
+        """
+        number_of_visits = len(individual_record.visits)
+        if self.k > number_of_visits:
+            return number_of_visits
+        return self.k
+
+    @staticmethod
+    def _distinct_subsequences(symbols, size, rank=None):
+        """
+        Generates the positions of the distinct subsequences of a given size of a sequence of symbols. Each distinct
+        subsequence is generated once, through the earliest occurrence of each of its symbols.
+
+        Parameters
+        ----------
+        symbols: list
+            the sequence of hashable symbols.
+        size: int
+            the size of the subsequences.
+        rank: function, optional
+            a function giving the rank of a symbol. If given, each position of the subsequences is filled trying the
+            symbols with the lowest rank first, otherwise in the order of their first occurrence.
+
+        Returns
+        -------
+        positions: generator of list[int]
+            the increasing positions of the symbols of each distinct subsequence.
+        """
+        occurrences = {}
+        for position, symbol in enumerate(symbols):
+            occurrences.setdefault(symbol, []).append(position)
+        if rank is not None:
+            occurrences = dict(sorted(occurrences.items(), key=lambda item: rank(item[0])))
+        number_of_symbols = len(symbols)
+        prefix = []
+
+        def extend(start):
+            if len(prefix) == size:
+                yield list(prefix)
+                return
+            last_start = number_of_symbols - (size - len(prefix))
+            for positions in occurrences.values():
+                j = bisect_left(positions, start)
+                if j < len(positions) and positions[j] <= last_start:
+                    prefix.append(positions[j])
+                    yield from extend(positions[j] + 1)
+                    prefix.pop()
+
+        return extend(0)
+
+    @staticmethod
+    def _distinct_multisets(symbols, size, rank=None):
+        """
+        Generates the positions of the distinct multisets of a given size of a collection of symbols. Each distinct
+        multiset is generated once, through the earliest occurrences of each of its symbols.
+
+        Parameters
+        ----------
+        symbols: list
+            the collection of hashable symbols.
+        size: int
+            the size of the multisets.
+        rank: function, optional
+            a function giving the rank of a symbol. If given, the multisets holding the symbols with the lowest rank
+            are generated first, otherwise the ones holding the symbols occurring first.
+
+        Returns
+        -------
+        positions: generator of list[int]
+            the increasing positions of the symbols of each distinct multiset.
+        """
+        occurrences = {}
+        for position, symbol in enumerate(symbols):
+            occurrences.setdefault(symbol, []).append(position)
+        if rank is not None:
+            occurrences = dict(sorted(occurrences.items(), key=lambda item: rank(item[0])))
+        groups = list(occurrences.values())
+        available = [0] * (len(groups) + 1)
+        for g in range(len(groups) - 1, -1, -1):
+            available[g] = available[g + 1] + len(groups[g])
+        chosen = []
+
+        def extend(g, missing):
+            if missing == 0:
+                yield sorted(chosen)
+                return
+            if available[g] < missing:
+                return
+            for multiplicity in range(min(missing, len(groups[g])), -1, -1):
+                chosen.extend(groups[g][:multiplicity])
+                yield from extend(g + 1, missing - multiplicity)
+                del chosen[len(chosen) - multiplicity:]
+
+        return extend(0, size)
+
+    @staticmethod
+    def _seconds(times):
+        """
+        Converts timestamps in the form YYYYMMDDhhmmss, the same form assumed by VisitAttack, to seconds.
+
+        Parameters
+        ----------
+        times: list[int]
+            the timestamps to convert.
+
+        Returns
+        -------
+        seconds: list[int]
+            the number of seconds of each timestamp since a fixed origin.
+        """
+        seconds = []
+        for time in times:
+            moment = datetime.strptime(str(time)[:14], "%Y%m%d%H%M%S")
+            seconds.append(moment.toordinal() * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second)
+        return seconds
+
+    @staticmethod
+    def _windowed_positions(symbols, seconds, size, window=None, max_gap=None, consecutive=False):
+        """
+        Generates the positions of the distinct subsequences of a given size of a time-sorted sequence of visits, whose
+        visits satisfy a time constraint. The subsequences are built by sliding along the sequence, extending each one
+        only with the visits allowed by the constraint, so that the cost grows with the length of the sequence rather
+        than with the number of all its subsequences.
+
+        Parameters
+        ----------
+        symbols: list
+            the hashable symbols of the visits, used to skip equal subsequences.
+        seconds: list[int]
+            the times of the visits, in seconds and in increasing order.
+        size: int
+            the size of the subsequences.
+        window: int, optional
+            the maximum number of seconds between the first and the last visit of a subsequence.
+        max_gap: int, optional
+            the maximum number of seconds between two successive visits of a subsequence.
+        consecutive: bool
+            if True, only visits that are consecutive in the sequence form a subsequence.
+
+        Returns
+        -------
+        positions: generator of list[int]
+            the increasing positions of the visits of each subsequence.
+        """
+        number_of_visits = len(symbols)
+        seen = set()
+        prefix = []
+
+        def last_allowed(first, last):
+            bound = number_of_visits - 1
+            if consecutive:
+                bound = min(bound, last + 1)
+            if max_gap is not None:
+                bound = min(bound, bisect_right(seconds, seconds[last] + max_gap) - 1)
+            if window is not None:
+                bound = min(bound, bisect_right(seconds, seconds[first] + window) - 1)
+            return bound
+
+        def extend():
+            if len(prefix) == size:
+                key = tuple(symbols[position] for position in prefix)
+                if key not in seen:
+                    seen.add(key)
+                    yield list(prefix)
+                return
+            bound = min(last_allowed(prefix[0], prefix[-1]), number_of_visits - (size - len(prefix)))
+            for position in range(prefix[-1] + 1, bound + 1):
+                prefix.append(position)
+                yield from extend()
+                prefix.pop()
+
+        if size == 0:
+            yield []
+            return
+        for first in range(0, number_of_visits - size + 1):
+            prefix.append(first)
+            yield from extend()
+            prefix.pop()
+
+    def best_instance(self, dataset, individual_record):
+        """
+        Finds the background knowledge instance of an individual with the highest probability of reidentification. The
+        probability of reidentification is defined as the ratio between the number of records belonging to the user,
+        and the number of records matching the background knowledge instance (its support).
+
+        The instances are tried from the one with the rarest locations, the most likely to give a high probability, and
+        the search stops as soon as an instance is matched only by the record it comes from, giving the maximum possible
+        probability (1 for an individual with a single record). Instances whose lower bound of the support shows that
+        they can not give a higher probability than the current one are not matched.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which to compute the privacy risk.
+        individual_record: IndividualRecord
+            the individual record of the individual of which to compute the privacy risk.
+
+        Returns
+        -------
+        risk: float
+            the privacy risk of the individual owner of the individual_record.
+        instance: numpy.array[(x,y,i)]
+            the instance with the highest probability of reidentification, None if the record has no instance. Among
+            instances with the same probability, the first one tried is returned.
+        support: int
+            the support of the instance, None if the record has no instance.
+        """
+        with self._dataset_scope(dataset):
+            num_records = self._num_records(dataset, individual_record.id)
+            risk = 0
+            best_instance = None
+            best_support = None
+            for _, instance in self._rarest_first(dataset, individual_record):
+                if best_instance is not None:
+                    lower_bound = self._support_lower_bound(dataset, instance)
+                    if lower_bound > 0 and num_records / lower_bound <= risk:
+                        continue
+                support = self.support(dataset, instance)
+                prob = num_records / support
+                if prob > risk or best_instance is None:
+                    risk = prob
+                    best_instance = instance
+                    best_support = support
+                    if risk >= num_records:
+                        break
+            return risk, best_instance, best_support
 
     def risk(self, dataset, individual_record):
         """
@@ -87,18 +641,288 @@ class Attack:
         risk: float
             the privacy risk of the individual owner of the individual_record.
         """
-        number_of_visits = len(individual_record.visits)
-        if self.k > number_of_visits:
-            instances = combinations(individual_record.visits, len(individual_record.visits))
-        else:
-            instances = combinations(individual_record.visits, self.k)
-        risk = 0
-        for instance in instances:
-            arr = array(list(instance), dtype=Trajectory.data_type)
-            prob = self.__reidentification_prob(dataset, arr, individual_record.id)
-            if prob > risk:
-                risk = prob
-        return risk
+        return self.best_instance(dataset, individual_record)[0]
+
+    def _prepare(self, dataset, rebuild=False):
+        """
+        Builds the structures the attack needs on the dataset, if they were not built yet. With a spatial tolerance,
+        this quantizes the coordinates of the dataset and indexes its records by grid cell.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the attack will be computed.
+        rebuild: bool
+            if True, the structures built on the dataset are discarded and built again, since its records may have
+            been changed in place (for instance by compact) after they were built.
+        """
+        if rebuild:
+            self.location_index = None
+        if self.grid is not None and (rebuild or not self.grid.indexes(dataset)):
+            self.grid.index(dataset)
+
+    @contextmanager
+    def _dataset_scope(self, dataset):
+        """
+        Context in which the attack is computed on a dataset that is not changed meanwhile. On entering, the structures
+        of the attack are built again on the dataset, and, without a spatial tolerance, its records are indexed by
+        location; all the computations made in the context reuse them. On exiting, the location index is dropped, since
+        the records of the dataset may be replaced, or their visits changed, after it. Entering the context again on
+        the same dataset, from within it, has no effect.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the attack is computed.
+        """
+        if self.__scoped_dataset is dataset:
+            yield
+            return
+        self._prepare(dataset, rebuild=True)
+        if self.grid is None:
+            self.location_index = LocationIndex().index(dataset)
+        self.__scoped_dataset = dataset
+        try:
+            yield
+        finally:
+            self.__scoped_dataset = None
+            self.location_index = None
+
+    def _candidate_index(self, dataset):
+        """
+        Returns the index through which the records that can match an instance are looked up, None if the whole
+        dataset has to be scanned.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the attack is computed.
+
+        Returns
+        -------
+        index: SpatialGrid or LocationIndex
+            the grid with a spatial tolerance, otherwise the location index, if the attack is computed in
+            _dataset_scope on the dataset.
+        """
+        self._prepare(dataset)
+        if self.grid is not None:
+            return self.grid
+        if self.location_index is not None and self.location_index.indexes(dataset):
+            return self.location_index
+        return None
+
+    def _frequency_index(self, dataset):
+        """
+        Returns an index giving the number of records of the dataset visiting each location. Outside of _dataset_scope
+        a new location index is built, and it is not kept by the attack.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the attack is computed.
+
+        Returns
+        -------
+        index: SpatialGrid or LocationIndex
+            the grid with a spatial tolerance, otherwise a location index on the dataset.
+        """
+        index = self._candidate_index(dataset)
+        if index is None:
+            index = LocationIndex().index(dataset)
+        return index
+
+    def _record_locations(self, individual_record):
+        """
+        Returns the locations of the visits of a record, in the form used by _same_location.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record of which to return the locations.
+
+        Returns
+        -------
+        locations: list
+            the (x, y) pairs of the visits, or their grid cells if the attack has a spatial tolerance.
+        """
+        if self.grid is None:
+            return self._instance_locations(individual_record.visits)
+        return self.grid.record_cells(individual_record)
+
+    def _instance_locations(self, instance):
+        """
+        Returns the locations of the visits of a background knowledge instance, in the form used by _same_location.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        locations: list
+            the (x, y) pairs of the visits, or their grid cells if the attack has a spatial tolerance.
+        """
+        if self.grid is None:
+            return list(zip(instance["x"].tolist(), instance["y"].tolist()))
+        return self.grid.quantize(instance).tolist()
+
+    def _same_location(self, instance_location, record_location):
+        """
+        Matches two locations, as returned by _instance_locations and _record_locations.
+
+        Returns
+        -------
+        same_location: bool
+            True if the locations are equal or, with a spatial tolerance, if they fall in adjacent cells.
+        """
+        if self.grid is None:
+            return instance_location == record_location
+        return SpatialGrid.adjacent(instance_location, record_location)
+
+    def _signature_times(self, visits):
+        """
+        Returns the times of the visits that a record must share with an instance to match it, None if the attack does
+        not match times. Attacks matching times should override this, so that the times enter the signatures.
+
+        Parameters
+        ----------
+        visits: numpy.array[(x,y,i)]
+            the visits of a record or of a background knowledge instance.
+
+        Returns
+        -------
+        times: list[int]
+            the times of the visits as matched by the attack, None if the attack does not match times.
+        """
+        return None
+
+    def __signature_mask(self, locations, times, neighbours):
+        """
+        Private function setting the bit of each (location, time) pair, and of the pairs with the neighbouring cells if
+        neighbours is True.
+        """
+        if times is None:
+            times = [None] * len(locations)
+        mask = 0
+        for location, time in zip(locations, times):
+            if neighbours:
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        key = ((location[0] + dx, location[1] + dy), time)
+                        mask |= 1 << (hash(key) % self.signature_bits)
+            else:
+                mask |= 1 << (hash((tuple(location), time)) % self.signature_bits)
+        return mask
+
+    def _record_signature(self, individual_record):
+        """
+        Computes the signature of a record: a bitmask with one bit set for each location (and time, if the attack
+        matches times) of its visits, and the number of its visits. With a spatial tolerance, the bits of the cells
+        adjacent to the ones of the visits are set too, since they match them.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record of which to compute the signature.
+
+        Returns
+        -------
+        signature: tuple(int, int)
+            the bitmask and the number of visits of the record.
+        """
+        visits = individual_record.visits
+        locations = self._record_locations(individual_record)
+        mask = self.__signature_mask(locations, self._signature_times(visits), self.grid is not None)
+        return mask, len(visits)
+
+    def _instance_signature(self, instance):
+        """
+        Computes the signature of a background knowledge instance, see _record_signature. Without neighbouring cells,
+        every bit of the signature of an instance is set in the signature of any record matching it.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance of which to compute the signature.
+
+        Returns
+        -------
+        signature: tuple(int, int)
+            the bitmask and the number of visits of the instance.
+        """
+        locations = self._instance_locations(instance)
+        return self.__signature_mask(locations, self._signature_times(instance), False), len(instance)
+
+    def _signatures(self, dataset):
+        """
+        Returns the signatures of the records of a dataset, in the same order of the dataset. The signatures are
+        computed once, and again only if the dataset changes. Records whose visits were replaced afterwards, for
+        instance by add_visit or compact, must be looked up through _signature.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset of which to return the signatures.
+
+        Returns
+        -------
+        signatures: list[tuple(int, int)]
+            the signature of each record of the dataset.
+        """
+        if self.signatures is None or self.__signed_dataset is not dataset or len(self.signatures) != len(dataset):
+            self.signatures = [self._record_signature(individual_record) for individual_record in dataset]
+            self.__signed_dataset = dataset
+            self.__signed_visits = [individual_record.visits for individual_record in dataset]
+        return self.signatures
+
+    def _signature(self, dataset, position):
+        """
+        Returns the signature of a record of a dataset, computing it again if the visits of the record were replaced
+        since it was computed. _signatures must have been called on the dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset of the record.
+        position: int
+            the position of the record in the dataset.
+
+        Returns
+        -------
+        signature: tuple(int, int)
+            the signature of the record.
+        """
+        individual_record = dataset[position]
+        if self.__signed_visits[position] is not individual_record.visits:
+            self.signatures[position] = self._record_signature(individual_record)
+            self.__signed_visits[position] = individual_record.visits
+        return self.signatures[position]
+
+    @staticmethod
+    def _may_match(record_signature, instance_signature):
+        """
+        Checks whether a record can match an instance, comparing their signatures. Every instance visit is matched to
+        a different visit of the record, at the same location (and time), so a record can match only if it has at least
+        as many visits and its bitmask contains the one of the instance. Records without visits are never rejected.
+
+        Parameters
+        ----------
+        record_signature: tuple(int, int)
+            the signature of the record, as returned by _record_signature.
+        instance_signature: tuple(int, int)
+            the signature of the instance, as returned by _instance_signature.
+
+        Returns
+        -------
+        may_match: bool
+            False if the record can not match the instance, True if it may.
+        """
+        record_mask, record_count = record_signature
+        instance_mask, instance_count = instance_signature
+        if record_count == 0:
+            return True
+        return record_count >= instance_count and instance_mask & ~record_mask == 0
 
     @abstractmethod
     def has_matching(self, individual_record, instance):
@@ -122,6 +946,55 @@ class LocationAttack(Attack):
     information.
     """
 
+    def instances(self, individual_record, rank=None):
+        """
+        Generates the background knowledge instances of a record. Since instances are matched as multisets of
+        locations, only the distinct multisets of k locations of the record are generated.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record from which to generate the instances.
+        rank: function, optional
+            a function giving the rank of a location (x, y). If given, the multisets holding the locations with the
+            lowest rank are generated first.
+
+        Returns
+        -------
+        instances: generator of numpy.array[(x,y,i)]
+            the background knowledge instances, with the same type of the visits of the record.
+        """
+        visits = individual_record.visits
+        locations = list(zip(visits["x"].tolist(), visits["y"].tolist()))
+        for positions in self._distinct_multisets(locations, self._instance_size(individual_record), rank):
+            yield visits[positions]
+
+    def _support_lower_bound(self, dataset, instance):
+        """
+        Computes a lower bound of the support of an instance with distinct locations: by the Bonferroni inequality, the
+        records visiting all of its m locations are at least the sum of the numbers of records visiting each location,
+        minus m - 1 times the number of records of the dataset. Instances repeating a location, or matched with a
+        spatial tolerance, where two locations of the instance may need the same visit of a record, have no bound.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which the support is computed.
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        lower_bound: int
+            a number of records not larger than the support of the instance, 0 if no bound is known.
+        """
+        locations = self._instance_locations(instance)
+        if self.grid is not None or len(set(locations)) != len(locations):
+            return 0
+        index = self._frequency_index(dataset)
+        lower_bound = sum(index.frequency(*location) for location in locations) - (len(locations) - 1) * len(dataset)
+        return max(lower_bound, 0)
+
     def has_matching(self, individual_record, instance):
         """
         The matching function for the LocationAttack.
@@ -140,22 +1013,28 @@ class LocationAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
-        control = ones(number_of_visits, dtype=bool)
-        count = 0
+        if target > number_of_visits:
+            return False
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
+        # for each visit of the record, the visit of the instance it is matched to, -1 if none
+        matched = [-1] * number_of_visits
+
+        def augment(j, tried):
+            # looks for a visit of the record for the j-th visit of the instance, moving the visits matched so far to
+            # other visits of the record if needed: with a spatial tolerance the same location is not transitive, so the
+            # first free visit may be the wrong one
+            for i in range(0, number_of_visits):
+                if not tried[i] and self._same_location(instance_locations[j], record_locations[i]):
+                    tried[i] = True
+                    if matched[i] == -1 or augment(matched[i], tried):
+                        matched[i] = j
+                        return True
+            return False
+
         has_match = True
         for j in range(0, target):
-            instance_elem = instance[j]
-            for i in range(0, number_of_visits):
-                record_elem = individual_record.visits[i]
-                samex = instance_elem["x"] == record_elem["x"]
-                samey = instance_elem["y"] == record_elem["y"]
-                if samex and samey and control[i]:
-                    count += 1
-                    control[i] = False
-                    break
-            if count == target:
-                break
-            if j >= count:
+            if not augment(j, [False] * number_of_visits):
                 has_match = False
                 break
         return has_match
@@ -167,6 +1046,74 @@ class LocationSequenceAttack(Attack):
     in which they appear is also considered.
     """
 
+    def __init__(self, k, spatial_tolerance=None, window=None, max_gap=None, consecutive=False):
+        """
+        Initializer for the LocationSequenceAttack. Call the generic Attack initializer but adds an optional time
+        constraint on the background knowledge: instead of any k visits, the adversary knows k visits close in time.
+        The constraint requires trajectories.
+
+        Parameters
+        ----------
+        k: int
+            parameter that defines the background knowledge configuration. It represents the quantity of information
+            that the adversary has. So, for example, if k = 2, the adversary will, ipothetically, know any combination
+            of the visits of a users of length 2.
+        spatial_tolerance: float, optional
+            the size of the grid cells with which to match locations, see Attack. If None (default), locations
+            are matched by exact equality.
+        window: int, optional
+            if given, the adversary only knows visits that happen within window seconds from the first one. Timestamps
+            are read in the form YYYYMMDDhhmmss.
+        max_gap: int, optional
+            if given, the adversary only knows visits that happen at most max_gap seconds after the previous one.
+        consecutive: bool
+            if True, the adversary only knows visits that are consecutive in the trajectory.
+        """
+        super().__init__(k, spatial_tolerance)
+        if (window is not None and window < 0) or (max_gap is not None and max_gap < 0):
+            raise ValueError
+        self.window = window
+        self.max_gap = max_gap
+        self.consecutive = consecutive
+
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, see Attack._parameters.
+        """
+        return super()._parameters() + [("window", self.window), ("max_gap", self.max_gap),
+                                        ("consecutive", self.consecutive)]
+
+    def instances(self, individual_record, rank=None):
+        """
+        Generates the background knowledge instances of a record. Since instances are matched as sequences of
+        locations, only the distinct subsequences of k locations of the record are generated. With a time constraint,
+        only the subsequences satisfying it are generated, and records with no such subsequence have no instance.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record from which to generate the instances.
+        rank: function, optional
+            a function giving the rank of a location (x, y). If given, without a time constraint, each visit of the
+            subsequences is chosen trying the locations with the lowest rank first.
+
+        Returns
+        -------
+        instances: generator of numpy.array[(x,y,i)]
+            the background knowledge instances, with the same type of the visits of the record.
+        """
+        visits = individual_record.visits
+        locations = list(zip(visits["x"].tolist(), visits["y"].tolist()))
+        size = self._instance_size(individual_record)
+        if self.window is None and self.max_gap is None and not self.consecutive:
+            positions = self._distinct_subsequences(locations, size, rank)
+        else:
+            seconds = self._seconds(visits["time"].tolist())
+            positions = self._windowed_positions(locations, seconds, size, self.window, self.max_gap,
+                                                 self.consecutive)
+        for instance_positions in positions:
+            yield visits[instance_positions]
+
     def has_matching(self, individual_record, instance):
         """
         The matching function for the LocationSequenceAttack.
@@ -185,18 +1132,17 @@ class LocationSequenceAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
         count = 0
         has_match = True
         for i in range(0, number_of_visits):
-            record_elem = individual_record.visits[i]
-            instance_elem = instance[count]
-            samex = instance_elem["x"] == record_elem["x"]
-            samey = instance_elem["y"] == record_elem["y"]
-            if samex and samey:
+            same_location = self._same_location(instance_locations[count], record_locations[i])
+            if same_location:
                 count += 1
             if count == target:
                 break
-            if (number_of_visits - i) < (target - count):
+            if (number_of_visits - i - 1) < (target - count):
                 has_match = False
                 break
         return has_match
@@ -210,7 +1156,7 @@ class VisitAttack(Attack):
     """
     precision_levels = ["Year", "Month", "Day", "Hour", "Minute", "Second"]
 
-    def __init__(self, k, precision):
+    def __init__(self, k, precision, spatial_tolerance=None, window=None, max_gap=None, consecutive=False):
         """
         Initializer for the VisitAttack. Call the generic Attack initializer but adds precision, to allow to specify
         the precision with which to consider the timestamps of the visits during the matching. This essentially
@@ -226,11 +1172,33 @@ class VisitAttack(Attack):
             can be either: "Year", "Month", "Day", "Hour", "Minute" or "Second". The timestamps of the visits will be
             matched depending on the precision specified. So, for instance, if precision is "Day", the timestamps of the
             visits will be matched up to the day, neglecting hour, minute and second.
+        spatial_tolerance: float, optional
+            the size of the grid cells with which to match locations, see Attack. If None (default), locations
+            are matched by exact equality.
+        window: int, optional
+            if given, the adversary only knows visits that happen within window seconds from the first one. Timestamps
+            are read in the form YYYYMMDDhhmmss.
+        max_gap: int, optional
+            if given, the adversary only knows visits that happen at most max_gap seconds after the previous one.
+        consecutive: bool
+            if True, the adversary only knows visits that are consecutive in the trajectory.
         """
-        super().__init__(k)
+        super().__init__(k, spatial_tolerance)
         if precision not in VisitAttack.precision_levels:
             raise ValueError
+        if (window is not None and window < 0) or (max_gap is not None and max_gap < 0):
+            raise ValueError
         self.precision = precision
+        self.window = window
+        self.max_gap = max_gap
+        self.consecutive = consecutive
+
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, see Attack._parameters.
+        """
+        return super()._parameters() + [("precision", self.precision), ("window", self.window),
+                                        ("max_gap", self.max_gap), ("consecutive", self.consecutive)]
 
     def __extract_precision(self, i):
         """
@@ -262,6 +1230,72 @@ class VisitAttack(Attack):
             num = int(num_string[:14])
         return num
 
+    def _truncated_times(self, times):
+        """
+        Cuts a list of times to the required precision.
+
+        Parameters
+        ----------
+        times: list[int]
+            the times to be cut.
+
+        Returns
+        -------
+        truncated: list[int]
+            the times cut to the required precision.
+        """
+        return [self.__extract_precision(time) for time in times]
+
+    def _signature_times(self, visits):
+        """
+        Returns the times of the visits cut to the precision of the attack, which a record must share with an
+        instance to match it.
+
+        Parameters
+        ----------
+        visits: numpy.array[(x,y,i)]
+            the visits of a record or of a background knowledge instance.
+
+        Returns
+        -------
+        times: list[int]
+            the times of the visits cut to the required precision.
+        """
+        return self._truncated_times(visits["time"].tolist())
+
+    def instances(self, individual_record, rank=None):
+        """
+        Generates the background knowledge instances of a record. Since instances are matched as sequences of
+        locations and times cut to the precision of the attack, only the distinct subsequences of k such visits of the
+        record are generated. With a time constraint, only the subsequences satisfying it are generated, and records
+        with no such subsequence have no instance.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record from which to generate the instances. It is considered a Trajectory.
+        rank: function, optional
+            a function giving the rank of a location (x, y). If given, without a time constraint, each visit of the
+            subsequences is chosen trying the locations with the lowest rank first.
+
+        Returns
+        -------
+        instances: generator of numpy.array[(x,y,i)]
+            the background knowledge instances, with the same type of the visits of the record.
+        """
+        visits = individual_record.visits
+        times = self._truncated_times(visits["time"].tolist())
+        symbols = list(zip(visits["x"].tolist(), visits["y"].tolist(), times))
+        size = self._instance_size(individual_record)
+        if self.window is None and self.max_gap is None and not self.consecutive:
+            symbol_rank = None if rank is None else lambda symbol: rank(symbol[:2])
+            positions = self._distinct_subsequences(symbols, size, symbol_rank)
+        else:
+            seconds = self._seconds(visits["time"].tolist())
+            positions = self._windowed_positions(symbols, seconds, size, self.window, self.max_gap, self.consecutive)
+        for instance_positions in positions:
+            yield visits[instance_positions]
+
     def has_matching(self, individual_record, instance):
         """
         The matching function for the LocationSequenceAttack.
@@ -280,16 +1314,17 @@ class VisitAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
         count = 0
         has_match = True
         for i in range(0, number_of_visits):
             record_elem = individual_record.visits[i]
             instance_elem = instance[count]
-            samex = instance_elem["x"] == record_elem["x"]
-            samey = instance_elem["y"] == record_elem["y"]
+            same_location = self._same_location(instance_locations[count], record_locations[i])
             t_diff = self.__extract_precision(instance_elem["time"]) - self.__extract_precision(record_elem["time"])
             samet = t_diff == 0
-            if samex and samey and samet:
+            if same_location and samet:
                 count += 1
             else:
                 too_early = t_diff < 0
@@ -298,7 +1333,7 @@ class VisitAttack(Attack):
                     break
             if count == target:
                 break
-            if (number_of_visits - i) < (target - count):
+            if (number_of_visits - i - 1) < (target - count):
                 has_match = False
                 break
         return has_match
@@ -310,7 +1345,7 @@ class FrequencyAttack(Attack):
     visit is also considered. It is also possible to specify a tolerance level.
     """
 
-    def __init__(self, k, tolerance):
+    def __init__(self, k, tolerance, spatial_tolerance=None):
         """
         Initializer for the FrequencyAttack. Call the generic Attack initializer but adds tolerance, to allow to specify
         the precision with which to consider the frequency of the visits during the matching. This essentially
@@ -328,12 +1363,21 @@ class FrequencyAttack(Attack):
             of at least the frequency of the visit in the instance times the tolerance. For instance, if the tolerance
             is 0.9, and the frequency of the visit in the instance is 10, it will match a visit in the individual record
             if it has the same location and at least frequency of 9.
+        spatial_tolerance: float, optional
+            the size of the grid cells with which to match locations, see Attack. If None (default), locations
+            are matched by exact equality.
         """
-        super().__init__(k)
+        super().__init__(k, spatial_tolerance)
         if tolerance < 0 or tolerance > 1:
             raise ValueError
         self.tolerance = tolerance
 
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, see Attack._parameters.
+        """
+        return super()._parameters() + [("tolerance", self.tolerance)]
+
     def has_matching(self, individual_record, instance):
         """
         The matching function for the LocationSequenceAttack.
@@ -352,16 +1396,17 @@ class FrequencyAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
         count = 0
         has_match = True
         for i in range(0, number_of_visits):
             record_elem = individual_record.visits[i]
             instance_elem = instance[count]
-            samex = instance_elem["x"] == record_elem["x"]
-            samey = instance_elem["y"] == record_elem["y"]
+            same_location = self._same_location(instance_locations[count], record_locations[i])
             f_diff = record_elem["freq"] - instance_elem["freq"] * self.tolerance
             samef = f_diff >= 0
-            if samex and samey and samef:
+            if same_location and samef:
                 count += 1
             else:
                 too_few_f = f_diff < 0
@@ -370,7 +1415,7 @@ class FrequencyAttack(Attack):
                     break
             if count == target:
                 break
-            if (number_of_visits - i) < (target - count):
+            if (number_of_visits - i - 1) < (target - count):
                 has_match = False
                 break
         return has_match
@@ -381,7 +1426,7 @@ class FrequencyAttack(Attack):
         probability of visit is also considered. It is also possible to specify a tolerance level.
         """
 
-        def __init__(self, k, tolerance):
+        def __init__(self, k, tolerance, spatial_tolerance=None):
             """
             Initializer for the ProbabilityAttack. Call the generic Attack initializer but adds tolerance, to allow to specify
             the precision with which to consider the probability of the visits during the matching. This essentially
@@ -399,12 +1444,21 @@ class FrequencyAttack(Attack):
                 that falls in the range of the probability of visit of the instance +/- the tolerance. For instance, if
                 the tolerance is 0.1, and the probability of the visit in the instance is 0.85, it will match a visit in
                 the individual record if it has the same location and a probability in the range [0.75,0.95]
+            spatial_tolerance: float, optional
+                the size of the grid cells with which to match locations, see Attack. If None (default), locations
+                are matched by exact equality.
             """
-            super().__init__(k)
+            super().__init__(k, spatial_tolerance)
             if tolerance < 0 or tolerance > 1:
                 raise ValueError
             self.tolerance = tolerance
 
+        def _parameters(self):
+            """
+            Returns the parameters of the attack, see Attack._parameters.
+            """
+            return super()._parameters() + [("tolerance", self.tolerance)]
+
         def has_matching(self, individual_record, instance):
             """
             The matching function for the LocationSequenceAttack.
@@ -423,17 +1477,18 @@ class FrequencyAttack(Attack):
             """
             target = len(instance)
             number_of_visits = len(individual_record.visits)
+            instance_locations = self._instance_locations(instance)
+            record_locations = self._record_locations(individual_record)
             count = 0
             has_match = True
             for i in range(0, number_of_visits):
                 record_elem = individual_record.visits[i]
                 instance_elem = instance[count]
-                samex = instance_elem["x"] == record_elem["x"]
-                samey = instance_elem["y"] == record_elem["y"]
+                same_location = self._same_location(instance_locations[count], record_locations[i])
                 p_diff_min = record_elem["prob"] - instance_elem["prob"] - self.tolerance
                 p_diff_max = record_elem["prob"] - instance_elem["prob"] + self.tolerance
                 samep = p_diff_min >= 0 and p_diff_max <= 0
-                if samex and samey and samep:
+                if same_location and samep:
                     count += 1
                 else:
                     too_few_p = p_diff_min < 0
@@ -442,7 +1497,7 @@ class FrequencyAttack(Attack):
                         break
                 if count == target:
                     break
-                if (number_of_visits - i) < (target - count):
+                if (number_of_visits - i - 1) < (target - count):
                     has_match = False
                     break
             return has_match
@@ -454,7 +1509,7 @@ class ProportionAttack(Attack):
     between the frequency of visit is also considered. It is also possible to specify a tolerance level.
     """
 
-    def __init__(self, k, tolerance):
+    def __init__(self, k, tolerance, spatial_tolerance=None):
         """
         Initializer for the ProportionAttack. Call the generic Attack initializer but adds tolerance, to allow to specify
         the precision with which to consider the proportion of frequency of the visits during the matching.
@@ -473,12 +1528,21 @@ class ProportionAttack(Attack):
             if the tolerance is 0.2, and the proportion between two visits in the istance is 0.4, it will match
             in the individual record if there are two visits with the same locations that have a proportion between
             their frequencies that lies between 0.2 and 0.6.
+        spatial_tolerance: float, optional
+            the size of the grid cells with which to match locations, see Attack. If None (default), locations
+            are matched by exact equality.
         """
-        super().__init__(k)
+        super().__init__(k, spatial_tolerance)
         if tolerance < 0 or tolerance > 1:
             raise ValueError
         self.tolerance = tolerance
 
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, see Attack._parameters.
+        """
+        return super()._parameters() + [("tolerance", self.tolerance)]
+
     def __match_proportions(self, matched_elements, instance):
         """
         Private function for the matching of frequencies proportions between two collections of elements: 
@@ -530,20 +1594,20 @@ class ProportionAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
         count = 0
         has_match = True
         matched_elements = FrequencyVector(individual_record.id)
         for i in range(0, number_of_visits):
             record_elem = individual_record.visits[i]
-            instance_elem = instance[count]
-            samex = instance_elem["x"] == record_elem["x"]
-            samey = instance_elem["y"] == record_elem["y"]
-            if samex and samey:
+            same_location = self._same_location(instance_locations[count], record_locations[i])
+            if same_location:
                 count += 1
                 matched_elements.add_visit(record_elem["x"], record_elem["y"], record_elem["freq"])
             if count == target:
                 break
-            if (number_of_visits - i) < (target - count):
+            if (number_of_visits - i - 1) < (target - count):
                 has_match = False
                 break
         if (has_match):
@@ -558,7 +1622,7 @@ class HomeWorkAttack(Attack):
 
     HomeWorkK = 0
 
-    def __init__(self, tolerance):
+    def __init__(self, tolerance, spatial_tolerance=None):
         """
         Initializer for the HomeWorkAttack. Call the generic Attack initializer but adds tolerance, to allow to specify
         the precision with which to consider the frequency of the visits during the matching. This essentially
@@ -576,12 +1640,21 @@ class HomeWorkAttack(Attack):
             of at least the frequency of the visit in the instance times the tolerance. For instance, if the tolerance
             is 0.9, and the frequency of the visit in the instance is 10, it will match a visit in the individual record
             if it has the same location and at least frequency of 9.
+        spatial_tolerance: float, optional
+            the size of the grid cells with which to match locations, see Attack. If None (default), locations
+            are matched by exact equality.
         """
-        super().__init__(HomeWorkAttack.HomeWorkK)
+        super().__init__(HomeWorkAttack.HomeWorkK, spatial_tolerance)
         if tolerance < 0 or tolerance > 1:
             raise ValueError
         self.tolerance = tolerance
 
+    def _parameters(self):
+        """
+        Returns the parameters of the attack, see Attack._parameters.
+        """
+        return super()._parameters() + [("tolerance", self.tolerance)]
+
     def has_matching(self, individual_record, instance):
         """
         The matching function for the LocationSequenceAttack.
@@ -600,16 +1673,17 @@ class HomeWorkAttack(Attack):
         """
         target = len(instance)
         number_of_visits = len(individual_record.visits)
+        instance_locations = self._instance_locations(instance)
+        record_locations = self._record_locations(individual_record)
         count = 0
         has_match = True
         for i in range(0, number_of_visits):
             record_elem = individual_record.visits[i]
             instance_elem = instance[count]
-            samex = instance_elem["x"] == record_elem["x"]
-            samey = instance_elem["y"] == record_elem["y"]
+            same_location = self._same_location(instance_locations[count], record_locations[i])
             f_diff = record_elem["freq"] - instance_elem["freq"] * self.tolerance
             samef = f_diff >= 0
-            if samex and samey and samef:
+            if same_location and samef:
                 count += 1
             else:
                 too_few_f = f_diff < 0
@@ -618,33 +1692,27 @@ class HomeWorkAttack(Attack):
                     break
             if count == target:
                 break
-            if (number_of_visits - i) < (target - count):
+            if (number_of_visits - i - 1) < (target - count):
                 has_match = False
                 break
         return has_match
 
-    def risk(self, dataset, individual_record):
+    def instances(self, individual_record, rank=None):
         """
-        Computes the risk of reidentification of an individual with respect to a dataset. We have to override the general
-        risk calculation procedure because for the Home and Work attack we don't have to compute combinations.
+        Generates the background knowledge instances of a record. We have to override the general instance generation
+        because for the Home and Work attack we don't have to compute combinations: the only instance is made of the two
+        most frequent locations.
 
         Parameters
         ----------
-        dataset: numpy.array[IndividualRecord]
-            the dataset against which to compute the privacy risk.
         individual_record: IndividualRecord
-            the individual record of the individual of which to compute the privacy risk.
+            the record from which to generate the instances. It is considered a FrequencyVector.
+        rank: function, optional
+            not used, since there is only one instance.
 
         Returns
         -------
-        risk: float
-            the privacy risk of the individual owner of the individual_record.
+        instances: generator of numpy.array[(x,y,i)]
+            the background knowledge instance, with the same type of the visits of the record.
         """
-        number_of_visits = len(individual_record.visits)
-        instance = (individual_record.visits[0], individual_record.visits[1])
-        risk = 0
-        arr = array(list(instance), dtype=Trajectory.data_type)
-        prob = self.__reidentification_prob(dataset, arr, individual_record.id)
-        if prob > risk:
-            risk = prob
-        return risk
\ No newline at end of file
+        yield individual_record.visits[:2].copy()
@@ -0,0 +1,235 @@
+from numpy import array, full, zeros, int64, arange, repeat, cumsum, bincount, unique, lexsort, nonzero, concatenate
+from attacks import LocationAttack
+
+
+class BatchEvaluator:
+    """
+    Computes the supports of many background knowledge instances at once, with vectorized operations instead of one
+    matching operation for each instance and record.
+
+    The visits of the dataset are interned into integer symbols: the location of the visit, its time if the attack
+    matches times (as for VisitAttack), and its occurrence number, so that the second visit of a record to the same
+    location is a different symbol than the first one. A record is then a set of symbols, and an instance a row of
+    symbols; the instances are evaluated in blocks, as a matrix with one row of symbol identifiers for each instance,
+    and the records containing all the symbols of each row are counted at once, intersecting the symbol -> records
+    lists of the whole block with array operations.
+
+    Containing the symbols of an instance is exactly the matching of the LocationAttack, which is thus computed without
+    any matching operation. For all other attacks it is necessary to match: the records containing the symbols of an
+    instance are only candidates, and are matched with has_matching. With a spatial tolerance the symbols of a record
+    also hold the cells adjacent to the ones of its visits, and occurrences are not counted.
+
+    Attributes
+    ----------
+    dataset: numpy.array[IndividualRecord]
+        the dataset against which the instances are evaluated.
+    attack: Attack
+        the attack with which the instances are matched.
+    block_size: int
+        the number of instances evaluated together. The memory used by a block grows with the number of records
+        visiting the locations of its instances.
+    exact: bool
+        True if containing the symbols of an instance is the same as matching it, False if the candidates have to be
+        matched with the attack.
+    """
+
+    def __init__(self, dataset, attack, block_size=4096):
+        """
+        Initializer for the evaluator. Interns the visits of the dataset and builds the symbol -> records lists.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset against which to evaluate the instances.
+        attack: Attack
+            the attack with which to match the instances.
+        block_size: int
+            the number of instances to evaluate together.
+        """
+        if block_size < 1:
+            raise ValueError
+        self.dataset = dataset
+        self.attack = attack
+        self.block_size = block_size
+        self.exact = type(attack) is LocationAttack and attack.grid is None
+        self.__symbols = {}
+        self.__empty_records = []
+        symbol_ids = []
+        record_positions = []
+        for position, individual_record in enumerate(dataset):
+            if len(individual_record.visits) == 0:
+                self.__empty_records.append(position)
+            for symbol in self.__record_symbols(individual_record):
+                symbol_ids.append(self.__symbols.setdefault(symbol, len(self.__symbols)))
+                record_positions.append(position)
+        symbol_ids = array(symbol_ids, dtype=int64)
+        record_positions = array(record_positions, dtype=int64)
+        order = lexsort((record_positions, symbol_ids))
+        # one more, empty, list for the symbols not visited by any record
+        self.__missing = len(self.__symbols)
+        self.__records = record_positions[order]
+        self.__offsets = zeros(self.__missing + 2, dtype=int64)
+        self.__offsets[1:-1] = cumsum(bincount(symbol_ids, minlength=self.__missing))
+        self.__offsets[-1] = self.__offsets[-2]
+
+    def __symbol_keys(self, locations, times, neighbours):
+        """
+        Private function building the symbols of some visits from their locations and times. Occurrences are counted
+        without a spatial tolerance; with one, the adjacent cells are added if neighbours is True.
+        """
+        if times is None:
+            times = [None] * len(locations)
+        keys = set()
+        if self.attack.grid is None:
+            occurrences = {}
+            for location, time in zip(locations, times):
+                occurrence = occurrences.get((location, time), 0) + 1
+                occurrences[(location, time)] = occurrence
+                keys.add((location, time, occurrence))
+        elif neighbours:
+            for location, time in zip(locations, times):
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        keys.add(((location[0] + dx, location[1] + dy), time, 1))
+        else:
+            for location, time in zip(locations, times):
+                keys.add((tuple(location), time, 1))
+        return keys
+
+    def __record_symbols(self, individual_record):
+        """
+        Private function returning the symbols of a record.
+        """
+        locations = self.attack._record_locations(individual_record)
+        return self.__symbol_keys(locations, self.attack._signature_times(individual_record.visits), True)
+
+    def symbols(self, instance):
+        """
+        Converts an instance into the identifiers of its symbols.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        symbols: list[int]
+            the identifiers of the distinct symbols of the instance. Symbols that no record has are all mapped to the
+            same identifier, with an empty list of records.
+        """
+        locations = self.attack._instance_locations(instance)
+        keys = self.__symbol_keys(locations, self.attack._signature_times(instance), False)
+        return sorted(set(self.__symbols.get(key, self.__missing) for key in keys))
+
+    def containing(self, rows):
+        """
+        Finds the records containing the symbols of a block of instances, given as rows of symbol identifiers.
+
+        Parameters
+        ----------
+        rows: numpy.array[int]
+            a matrix with one row for each instance, holding the identifiers of its symbols as returned by symbols,
+            padded with -1 to the length of the longest row.
+
+        Returns
+        -------
+        contained: list[numpy.array[int]]
+            for each instance, the positions of the records containing all its symbols, in increasing order.
+        """
+        number_of_records = len(self.dataset)
+        required = (rows >= 0).sum(axis=1)
+        instance_rows, columns = nonzero(rows >= 0)
+        symbols = rows[instance_rows, columns]
+        starts = self.__offsets[symbols]
+        lengths = self.__offsets[symbols + 1] - starts
+        owners = repeat(instance_rows, lengths)
+        shifts = arange(lengths.sum()) - repeat(cumsum(lengths) - lengths, lengths)
+        keys = owners * number_of_records + self.__records[repeat(starts, lengths) + shifts]
+        keys, counts = unique(keys, return_counts=True)
+        keys = keys[counts == required[keys // number_of_records]]
+        bounds = cumsum(bincount(keys // number_of_records, minlength=len(rows)))
+        contained = []
+        start = 0
+        for row, stop in enumerate(bounds.tolist()):
+            if required[row] == 0:
+                contained.append(arange(number_of_records, dtype=int64))
+            else:
+                contained.append(keys[start:stop] % number_of_records)
+            start = stop
+        return contained
+
+    def supports(self, instances):
+        """
+        Computes the supports of some background knowledge instances, evaluating them in blocks.
+
+        Parameters
+        ----------
+        instances: list[numpy.array[(x,y,i)]]
+            the background knowledge instances.
+
+        Returns
+        -------
+        supports: numpy.array[int]
+            the number of records of the dataset matching each instance.
+        """
+        supports = zeros(len(instances), dtype=int64)
+        for start in range(0, len(instances), self.block_size):
+            block = instances[start:start + self.block_size]
+            block_symbols = [self.symbols(instance) for instance in block]
+            rows = full((len(block), max(len(symbols) for symbols in block_symbols)), -1, dtype=int64)
+            for row, symbols in enumerate(block_symbols):
+                rows[row, :len(symbols)] = symbols
+            for row, records in enumerate(self.containing(rows)):
+                if self.exact:
+                    supports[start + row] = len(records)
+                else:
+                    supports[start + row] = self.__matching(block[row], records)
+        return supports
+
+    def __matching(self, instance, records):
+        """
+        Private function counting the candidate records, and the records without visits, that match an instance.
+        """
+        if self.__empty_records and len(records) < len(self.dataset):
+            records = unique(concatenate((records, array(self.__empty_records, dtype=int64))))
+        support = 0
+        for position in records.tolist():
+            if self.attack.has_matching(self.dataset[position], instance):
+                support += 1
+        return support
+
+    def all_risks(self):
+        """
+        Computes privacy risk for all individuals in the dataset, as Attack.all_risks. The distinct instances of all
+        the records are evaluated in blocks.
+
+        Returns
+        -------
+        risk: dict{int : float}
+            a dictionary with the identifier of each individual paired with her risk.
+        """
+        id_counts = {}
+        for individual_record in self.dataset:
+            id_counts[individual_record.id] = id_counts.get(individual_record.id, 0) + 1
+        risks = {}
+        for start in range(0, len(self.dataset), self.block_size):
+            records = self.dataset[start:start + self.block_size]
+            distinct = {}
+            owned = []
+            for individual_record in records:
+                keys = []
+                for instance in self.attack.instances(individual_record):
+                    key = (instance.dtype, instance.tobytes())
+                    distinct.setdefault(key, instance)
+                    keys.append(key)
+                owned.append((individual_record.id, keys))
+            support_of = dict(zip(distinct, self.supports(list(distinct.values())).tolist()))
+            for individual_id, keys in owned:
+                risk = 0
+                for key in keys:
+                    prob = id_counts[individual_id] / support_of[key]
+                    if prob > risk:
+                        risk = prob
+                risks[individual_id] = risk
+        return risks
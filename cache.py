@@ -0,0 +1,179 @@
+from hashlib import sha256
+from os import listdir, makedirs, remove, replace, utime
+from os.path import getmtime, getsize, join
+from pickle import dump, load, HIGHEST_PROTOCOL, UnpicklingError
+from attacks import MATCHING_VERSION
+
+
+class ResultCache:
+    """
+    Persistent cache of the risks computed by attacks, stored on local disk. The risks of an attack on a dataset are
+    stored under a fingerprint of the content of the dataset, of the class and the parameters of the attack and of the
+    version of the matching semantics of the library, so that a repeated computation returns the stored risks, while any
+    change in the data, in the attack or in the matching semantics gives a new fingerprint.
+
+    Each entry is a file of the directory of the cache. When the entries take more than max_bytes, the least recently
+    used ones are removed.
+
+    Attributes
+    ----------
+    directory: str
+        the directory in which the risks are stored.
+    max_bytes: int
+        the maximum number of bytes taken by the entries, None for no limit.
+    """
+
+    suffix = ".risks"
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Initializer for the cache. Creates the directory if it does not exist.
+
+        Parameters
+        ----------
+        directory: str
+            the directory in which to store the risks.
+        max_bytes: int, optional
+            the maximum number of bytes taken by the entries. If None (default) entries are never removed.
+        """
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError
+        makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def fingerprint(dataset, attack):
+        """
+        Computes the fingerprint of an attack on a dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which the risks are computed.
+        attack: Attack
+            the attack with which the risks are computed.
+
+        Returns
+        -------
+        fingerprint: str
+            the hexadecimal digest of the matching version, of the class and parameters of the attack and of the
+            identifiers and visits of the records of the dataset, in order.
+        """
+        digest = sha256()
+        digest.update(repr(MATCHING_VERSION).encode())
+        digest.update((type(attack).__module__ + "." + type(attack).__qualname__).encode())
+        digest.update(attack.describe().encode())
+        for individual_record in dataset:
+            visits = individual_record.visits
+            digest.update(repr((individual_record.id, visits.dtype.descr, len(visits))).encode())
+            digest.update(visits.tobytes())
+        return digest.hexdigest()
+
+    def get(self, dataset, attack):
+        """
+        Returns the stored risks of an attack on a dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which the risks are computed.
+        attack: Attack
+            the attack with which the risks are computed.
+
+        Returns
+        -------
+        risks: dict{int : float}
+            the stored risks, as returned by Attack.all_risks, None if they are not in the cache.
+        """
+        filename = self.__filename(ResultCache.fingerprint(dataset, attack))
+        try:
+            with open(filename, "rb") as f:
+                risks = load(f)
+        except (OSError, EOFError, UnpicklingError):
+            return None
+        utime(filename)
+        return risks
+
+    def put(self, dataset, attack, risks):
+        """
+        Stores the risks of an attack on a dataset, then removes the least recently used entries if the cache is over
+        its size.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which the risks were computed.
+        attack: Attack
+            the attack with which the risks were computed.
+        risks: dict{int : float}
+            the risks, as returned by Attack.all_risks.
+        """
+        filename = self.__filename(ResultCache.fingerprint(dataset, attack))
+        with open(filename + ".tmp", "wb") as f:
+            dump(risks, f, protocol=HIGHEST_PROTOCOL)
+        replace(filename + ".tmp", filename)
+        self.__evict(filename)
+
+    def all_risks(self, dataset, attack):
+        """
+        Computes privacy risk for all individuals in the dataset, returning the stored risks if the same attack was
+        already computed on the same data.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+        attack: Attack
+            the attack with which to compute the risks.
+
+        Returns
+        -------
+        risks: dict{int : float}
+            a dictionary with the identifier of each individual paired with her risk, see Attack.all_risks.
+        """
+        risks = self.get(dataset, attack)
+        if risks is None:
+            risks = attack.all_risks(dataset)
+            self.put(dataset, attack, risks)
+        return risks
+
+    def size(self):
+        """
+        Returns the number of bytes taken by the entries of the cache.
+        """
+        return sum(getsize(filename) for filename in self.__entries())
+
+    def clear(self):
+        """
+        Removes all the entries of the cache.
+        """
+        for filename in self.__entries():
+            remove(filename)
+
+    def __filename(self, fingerprint):
+        """
+        Private function returning the name of the file of an entry.
+        """
+        return join(self.directory, fingerprint + ResultCache.suffix)
+
+    def __entries(self):
+        """
+        Private function returning the names of the files of the entries.
+        """
+        return [join(self.directory, name) for name in listdir(self.directory) if name.endswith(ResultCache.suffix)]
+
+    def __evict(self, keep):
+        """
+        Private function removing the least recently used entries, except keep, until the cache is within its size.
+        """
+        if self.max_bytes is None:
+            return
+        entries = sorted((getmtime(filename), getsize(filename), filename) for filename in self.__entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if total <= self.max_bytes:
+                break
+            if filename != keep:
+                remove(filename)
+                total -= size
@@ -1,10 +1,14 @@
 from abc import ABCMeta, abstractmethod
-from numpy import array, searchsorted, insert
+from sys import getsizeof
+from numpy import array, searchsorted, insert, iinfo, dtype, issubdtype, integer, unique, lexsort, bincount, \
+    concatenate, repeat, arange, empty, int64
 
 
 class IndividualRecord:
     """
-    Abstract class for a generic mobility individual record
+    Abstract class for a generic mobility individual record. Records declare __slots__, to save the memory of a
+    __dict__ for each of them: a record only holds its identifier and its visits, and no other attribute can be set on
+    it.
 
     Attributes
     ----------
@@ -13,6 +17,7 @@ class IndividualRecord:
         Should be overwritten by implementing classes, if needed.
     """
     __metaclass__ = ABCMeta
+    __slots__ = ("visits", "id")
 
     data_type = [("x", float), ("y", float), ("i", float)]
 
@@ -47,6 +52,7 @@ class Trajectory(IndividualRecord):
     data_type:
         the type of the visits that  will compose a trajectory.
     """
+    __slots__ = ()
 
     data_type = [("x", float), ("y", float), ("time", "int")]
 
@@ -91,6 +97,7 @@ class FrequencyVector(IndividualRecord):
     data_type:
         the type of the visits that  will compose a trajectory.
     """
+    __slots__ = ()
     data_type = [("x", float), ("y", float), ("freq", int)]
 
     def add_visit(self, x, y, i):
@@ -135,6 +142,7 @@ class ProbabilityVector(IndividualRecord):
     data_type:
         the type of the visits that  will compose a trajectory.
     """
+    __slots__ = ()
     data_type = [("x", float), ("y", float), ("prob", float)]
 
     def add_visit(self, x, y, i):
@@ -166,3 +174,292 @@ class ProbabilityVector(IndividualRecord):
         for v in self.visits:
             repr += "," + str(v["x"]) + "," + str(v["y"]) + "," + str(v["prob"])
         return repr
+
+
+def compact_data_type(data_type, coordinate_dtype="float32", time_dtype="int64", frequency_dtype="uint32"):
+    """
+    Builds a narrower version of the type of the visits of a record.
+
+    Parameters
+    ----------
+    data_type: list[(str, type)]
+        the type of the visits, for example Trajectory.data_type.
+    coordinate_dtype: str
+        the type of the geographical coordinates "x" and "y".
+    time_dtype: str
+        the type of the timestamps "time". Timestamps in the form YYYYMMDDhhmmss, as read by the parsers, need 64 bits;
+        "uint32" halves their memory for datasets whose timestamps are epoch seconds.
+    frequency_dtype: str
+        the type of the frequencies "freq".
+
+    Returns
+    -------
+    compact_type: list[(str, type)]
+        the narrower type of the visits. Fields without a narrower type are left unchanged.
+    """
+    narrow = {"x": coordinate_dtype, "y": coordinate_dtype, "time": time_dtype, "freq": frequency_dtype}
+    return [(name, narrow.get(name, kind)) for name, kind in data_type]
+
+
+def compact(dataset, coordinate_dtype="float32", time_dtype="int64", frequency_dtype="uint32"):
+    """
+    Converts, in place, the visits of all the records of a dataset to narrower types, to reduce the memory used by the
+    dataset. Coordinates are compared by exact equality during the attacks, so records compared against a compact
+    dataset should be compacted with the same types. To replace the coordinates with integer location ids, see
+    intern_locations.
+
+    Parameters
+    ----------
+    dataset: list[IndividualRecord]
+        the dataset to compact.
+    coordinate_dtype: str
+        the type of the geographical coordinates "x" and "y".
+    time_dtype: str
+        the type of the timestamps "time". The default keeps the 64 bits needed by timestamps in the form
+        YYYYMMDDhhmmss; "uint32" can be used for datasets whose timestamps are epoch seconds.
+    frequency_dtype: str
+        the type of the frequencies "freq".
+
+    Returns
+    -------
+    dataset: list[IndividualRecord]
+        the same dataset, with compact visits.
+
+    Raises
+    ------
+    ValueError
+        if the values of an integer field do not fit in the requested type.
+    """
+    for individual_record in dataset:
+        visits = individual_record.visits
+        current_type = [(name, visits.dtype.fields[name][0]) for name in visits.dtype.names]
+        data_type = compact_data_type(current_type, coordinate_dtype, time_dtype, frequency_dtype)
+        for name, kind in data_type:
+            if visits.size > 0 and issubdtype(dtype(kind), integer):
+                limits = iinfo(kind)
+                if visits[name].min() < limits.min or visits[name].max() > limits.max:
+                    raise ValueError
+        individual_record.visits = visits.astype(data_type)
+    return dataset
+
+
+def intern_locations(dataset, location_dtype="int32", locations=None):
+    """
+    Replaces, in place, the coordinates of the visits of all the records of a dataset with integer location ids: "x"
+    holds the id of the location of the visit and "y" is 0. Two visits have the same id only if they have the same
+    coordinates, so attacks matching locations by exact equality give the same risks; a spatial tolerance, which needs
+    the coordinates, can not be used. Records compared against the dataset should be interned with the same locations.
+
+    Parameters
+    ----------
+    dataset: list[IndividualRecord]
+        the dataset whose locations to intern.
+    location_dtype: str
+        the integer type of the location ids.
+    locations: numpy.array, optional
+        the coordinates of the locations already interned, as returned by a previous call: their ids are kept, and
+        new locations get the following ids.
+
+    Returns
+    -------
+    locations: numpy.array[float]
+        an array of shape (n, 2) with the coordinates of the location of each id.
+
+    Raises
+    ------
+    ValueError
+        if the ids of the locations do not fit in the requested type.
+    """
+    ids = {}
+    if locations is not None:
+        for location in locations.tolist():
+            ids[tuple(location)] = len(ids)
+    for individual_record in dataset:
+        visits = individual_record.visits
+        location_ids = [ids.setdefault(location, len(ids))
+                        for location in zip(visits["x"].tolist(), visits["y"].tolist())]
+        if len(ids) > 0 and len(ids) - 1 > iinfo(location_dtype).max:
+            raise ValueError
+        data_type = [(name, location_dtype if name in ("x", "y") else visits.dtype.fields[name][0])
+                     for name in visits.dtype.names]
+        interned = empty(len(visits), dtype=data_type)
+        for name in visits.dtype.names:
+            interned[name] = visits[name] if name not in ("x", "y") else 0
+        interned["x"] = location_ids
+        individual_record.visits = interned
+    return array(list(ids), dtype=float).reshape(-1, 2)
+
+
+def memory_report(dataset):
+    """
+    Measures the memory used by a dataset, divided by component.
+
+    Parameters
+    ----------
+    dataset: list[IndividualRecord]
+        the dataset to measure.
+
+    Returns
+    -------
+    report: dict{str : int}
+        the bytes used by: the container of the records ("container"), the record objects ("records"), the
+        identifiers ("ids"), the numpy arrays of the visits without their data ("visit_arrays"), the data of the
+        visits ("visits"), and their sum ("total").
+    """
+    report = {"container": getsizeof(dataset), "records": 0, "ids": 0, "visit_arrays": 0, "visits": 0}
+    for individual_record in dataset:
+        report["records"] += getsizeof(individual_record)
+        if hasattr(individual_record, "__dict__"):
+            report["records"] += getsizeof(individual_record.__dict__)
+        report["ids"] += getsizeof(individual_record.id)
+        report["visit_arrays"] += getsizeof(individual_record.visits) - individual_record.visits.nbytes
+        report["visits"] += individual_record.visits.nbytes
+    report["total"] = sum(report.values())
+    return report
+
+
+def __group_locations(users, x, y, number_of_users):
+    """
+    Private function counting the visits of each user to each location, with a single vectorized grouping. Returns the
+    boundaries of the users and, for each (user, location), the coordinates and the number of visits, sorted by user and
+    then from the most to the least frequent location.
+    """
+    keys = empty(len(users), dtype=[("user", int64), ("x", float), ("y", float)])
+    keys["user"] = users
+    keys["x"] = x
+    keys["y"] = y
+    locations, counts = unique(keys, return_counts=True)
+    order = lexsort((-counts, locations["user"]))
+    locations = locations[order]
+    counts = counts[order]
+    bounds = searchsorted(locations["user"], arange(number_of_users + 1))
+    return bounds, locations, counts
+
+
+def __build_vectors(record_class, ids, bounds, locations, values):
+    """
+    Private function building the records of a vector class from the grouped locations of the users.
+    """
+    records = []
+    for position, individual_id in enumerate(ids):
+        start, stop = bounds[position], bounds[position + 1]
+        record = record_class(individual_id)
+        visits = empty(stop - start, dtype=record_class.data_type)
+        visits["x"] = locations["x"][start:stop]
+        visits["y"] = locations["y"][start:stop]
+        visits[visits.dtype.names[2]] = values[start:stop]
+        record.visits = visits
+        records.append(record)
+    return records
+
+
+def __trajectory_columns(trajectories):
+    """
+    Private function concatenating the visits of a list of trajectories into columns.
+    """
+    lengths = array([len(trajectory.visits) for trajectory in trajectories], dtype=int64)
+    users = repeat(arange(len(trajectories)), lengths)
+    if len(trajectories) == 0:
+        return users, array([], dtype=float), array([], dtype=float)
+    x = concatenate([trajectory.visits["x"] for trajectory in trajectories])
+    y = concatenate([trajectory.visits["y"] for trajectory in trajectories])
+    return users, x, y
+
+
+def __column_users(ids):
+    """
+    Private function mapping the identifier of each visit to the position of its user.
+    """
+    unique_ids, users = unique(array(ids), return_inverse=True)
+    return unique_ids.tolist(), users.ravel()
+
+
+def columns_to_frequency_vectors(ids, x, y):
+    """
+    Converts visits stored in columns into frequency vectors. The visits of each individual are counted by location
+    with a single vectorized grouping, and each frequency vector is built already sorted from the most to the least
+    frequent location, as kept by FrequencyVector.add_visit.
+
+    Parameters
+    ----------
+    ids: numpy.array
+        the identifier of the individual of each visit.
+    x: numpy.array[float]
+        the first geographical coordinate of each visit.
+    y: numpy.array[float]
+        the second geographical coordinate of each visit.
+
+    Returns
+    -------
+    frequency_vectors: FrequencyVector[]
+        one frequency vector for each distinct identifier, sorted by identifier.
+    """
+    unique_ids, users = __column_users(ids)
+    bounds, locations, counts = __group_locations(users, x, y, len(unique_ids))
+    return __build_vectors(FrequencyVector, unique_ids, bounds, locations, counts)
+
+
+def columns_to_probability_vectors(ids, x, y):
+    """
+    Converts visits stored in columns into probability vectors. The probability of a location is the fraction of
+    the visits of the individual made to the location. Each probability vector is built already sorted from the most to
+    the least probable location, as kept by ProbabilityVector.add_visit.
+
+    Parameters
+    ----------
+    ids: numpy.array
+        the identifier of the individual of each visit.
+    x: numpy.array[float]
+        the first geographical coordinate of each visit.
+    y: numpy.array[float]
+        the second geographical coordinate of each visit.
+
+    Returns
+    -------
+    probability_vectors: ProbabilityVector[]
+        one probability vector for each distinct identifier, sorted by identifier.
+    """
+    unique_ids, users = __column_users(ids)
+    bounds, locations, counts = __group_locations(users, x, y, len(unique_ids))
+    totals = bincount(users, minlength=len(unique_ids))
+    return __build_vectors(ProbabilityVector, unique_ids, bounds, locations, counts / totals[locations["user"]])
+
+
+def trajectories_to_frequency_vectors(trajectories):
+    """
+    Converts trajectories into frequency vectors, in memory. See columns_to_frequency_vectors.
+
+    Parameters
+    ----------
+    trajectories: Trajectory[]
+        the trajectories to convert.
+
+    Returns
+    -------
+    frequency_vectors: FrequencyVector[]
+        the frequency vector of each trajectory, in the same order and with the same identifier.
+    """
+    users, x, y = __trajectory_columns(trajectories)
+    bounds, locations, counts = __group_locations(users, x, y, len(trajectories))
+    return __build_vectors(FrequencyVector, [trajectory.id for trajectory in trajectories], bounds, locations, counts)
+
+
+def trajectories_to_probability_vectors(trajectories):
+    """
+    Converts trajectories into probability vectors, in memory. See columns_to_probability_vectors.
+
+    Parameters
+    ----------
+    trajectories: Trajectory[]
+        the trajectories to convert.
+
+    Returns
+    -------
+    probability_vectors: ProbabilityVector[]
+        the probability vector of each trajectory, in the same order and with the same identifier.
+    """
+    users, x, y = __trajectory_columns(trajectories)
+    bounds, locations, counts = __group_locations(users, x, y, len(trajectories))
+    totals = bincount(users, minlength=len(trajectories))
+    ids = [trajectory.id for trajectory in trajectories]
+    return __build_vectors(ProbabilityVector, ids, bounds, locations, counts / totals[locations["user"]])
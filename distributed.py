@@ -0,0 +1,217 @@
+from multiprocessing import Pipe, Process
+from zlib import crc32
+from numpy import array, frombuffer, zeros, int64
+
+
+def partition(dataset, n_shards):
+    """
+    Partitions a dataset by individual: all the records of an individual end up in the same shard. The shard of an
+    individual only depends on her identifier, so that datasets partitioned separately are partitioned consistently.
+
+    Parameters
+    ----------
+    dataset: list[IndividualRecord]
+        the dataset to partition.
+    n_shards: int
+        the number of shards.
+
+    Returns
+    -------
+    shards: list[list[IndividualRecord]]
+        the shards of the dataset.
+    """
+    shards = [[] for _ in range(n_shards)]
+    for individual_record in dataset:
+        shards[crc32(str(individual_record.id).encode()) % n_shards].append(individual_record)
+    return shards
+
+
+def partial_supports(attack, shard, instances):
+    """
+    Computes the partial supports of some background knowledge instances on a shard of the dataset. The support of an
+    instance on the whole dataset is the sum of its partial supports on all the shards.
+
+    Parameters
+    ----------
+    attack: Attack
+        the attack with which to match the instances.
+    shard: list[IndividualRecord]
+        the shard of the dataset.
+    instances: list[numpy.array[(x,y,i)]]
+        the background knowledge instances.
+
+    Returns
+    -------
+    supports: numpy.array[int]
+        the number of records of the shard matching each instance.
+    """
+    supports = zeros(len(instances), dtype=int64)
+    for position, instance in enumerate(instances):
+        supports[position] = attack.support(shard, instance)
+    return supports
+
+
+def merge_partial_supports(partials):
+    """
+    Merges the partial supports computed on the shards of a dataset.
+
+    Parameters
+    ----------
+    partials: list[numpy.array[int]]
+        the partial supports of the same instances, one array for each shard.
+
+    Returns
+    -------
+    supports: numpy.array[int]
+        the supports of the instances on the whole dataset.
+    """
+    supports = None
+    for partial in partials:
+        supports = array(partial) if supports is None else supports + partial
+    return supports
+
+
+def __shard_worker(connection, attack, shard, reader):
+    """
+    Private function run by the process holding a shard. It answers the requests of sharded_all_risks until it
+    receives None. If reading the shard or answering a request fails, the error is sent in place of the answer and
+    the worker stops.
+    """
+    try:
+        __serve_shard(connection, attack, shard, reader)
+    except Exception as error:
+        connection.send(error)
+    connection.close()
+
+
+def __serve_shard(connection, attack, shard, reader):
+    """
+    Private function answering the requests of sharded_all_risks on a shard.
+    """
+    if reader is not None:
+        shard = reader(shard)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, payload = message
+        if command == "size":
+            connection.send(len(shard))
+        elif command == "id_counts":
+            id_counts = {}
+            for individual_record in shard:
+                id_counts[individual_record.id] = id_counts.get(individual_record.id, 0) + 1
+            connection.send(id_counts)
+        elif command == "instances":
+            start, stop = payload
+            owned = []
+            for individual_record in shard[start:stop]:
+                keys = (instance.tobytes() for instance in attack.instances(individual_record))
+                owned.append((individual_record.id, individual_record.visits.dtype, list(dict.fromkeys(keys))))
+            connection.send(owned)
+        elif command == "supports":
+            instances = [frombuffer(key, dtype=kind) for kind, key in payload]
+            connection.send(partial_supports(attack, shard, instances))
+
+
+def __send(connection, message):
+    """
+    Private function sending a request to a worker. A worker that stopped can not receive it: its error, or the end of
+    its connection, is found by the next __receive.
+    """
+    try:
+        connection.send(message)
+    except (BrokenPipeError, OSError):
+        pass
+
+
+def __receive(connection):
+    """
+    Private function receiving the answer of a worker, raising the error it reported instead of an answer.
+    """
+    answer = connection.recv()
+    if isinstance(answer, Exception):
+        raise answer
+    return answer
+
+
+def __stop(workers, timeout=5):
+    """
+    Private function stopping the workers: each one is asked to stop, and the ones that are still running after
+    timeout seconds are terminated. All of them are joined.
+    """
+    for process, connection in workers:
+        __send(connection, None)
+        try:
+            connection.close()
+        except OSError:
+            pass
+    for process, _ in workers:
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+
+def sharded_all_risks(attack, shards, reader=None, batch_size=1000):
+    """
+    Computes privacy risk for all individuals of a dataset partitioned in shards. Each shard is held by its own worker
+    process, standing in for a node: the workers generate the instances of their own records, the instances are sent to
+    all the workers in batches, each worker computes their partial supports on its shard, and the partial supports are
+    merged into the final risks. If the shards are files read by the workers, no process ever holds the whole dataset;
+    shards passed in memory are also held by the caller. An error raised by a worker is raised again by this function,
+    after all the workers are stopped.
+
+    Parameters
+    ----------
+    attack: Attack
+        the attack with which to compute the risks.
+    shards: list
+        the shards of the dataset, for instance as returned by partition. If reader is given, each shard is instead
+        the name of a file, which is read by the worker itself.
+    reader: function, optional
+        the function with which the workers read their shard from file, for instance
+        parsers.read_trajectory_dataset_datetime.
+    batch_size: int
+        the number of records whose instances are evaluated together.
+
+    Returns
+    -------
+    risks: dict{int : float}
+        a dictionary with the identifier of each individual paired with her risk.
+    """
+    workers = []
+    try:
+        for shard in shards:
+            connection, worker_connection = Pipe()
+            process = Process(target=__shard_worker, args=(worker_connection, attack, shard, reader), daemon=True)
+            process.start()
+            workers.append((process, connection))
+        id_counts = {}
+        for _, connection in workers:
+            __send(connection, ("id_counts", None))
+        for _, connection in workers:
+            for individual_id, count in __receive(connection).items():
+                id_counts[individual_id] = id_counts.get(individual_id, 0) + count
+        risks = {}
+        for _, owner_connection in workers:
+            __send(owner_connection, ("size", None))
+            size = __receive(owner_connection)
+            for start in range(0, size, batch_size):
+                __send(owner_connection, ("instances", (start, start + batch_size)))
+                owned = __receive(owner_connection)
+                distinct = list(dict.fromkeys((kind, key) for _, kind, keys in owned for key in keys))
+                for _, connection in workers:
+                    __send(connection, ("supports", distinct))
+                supports = merge_partial_supports([__receive(connection) for _, connection in workers])
+                support_of = dict(zip(distinct, supports.tolist()))
+                for individual_id, kind, keys in owned:
+                    risk = risks.get(individual_id, 0)
+                    for key in keys:
+                        prob = id_counts[individual_id] / support_of[(kind, key)]
+                        if prob > risk:
+                            risk = prob
+                    risks[individual_id] = risk
+        return risks
+    finally:
+        __stop(workers)
@@ -0,0 +1,250 @@
+from collections import OrderedDict
+from batch import BatchEvaluator
+
+
+class RiskEngine:
+    """
+    Computes privacy risks against a fixed dataset with a fixed attack, answering many queries over time. The indexes on
+    the dataset are built once, at creation, and the supports of the background knowledge instances are cached across
+    queries, so that each query only pays for the instances it has not seen before. Queries made together, see
+    batch_risks, have the supports of their new instances computed at once, with a BatchEvaluator on the dataset.
+
+    Queries can be made both for records of the dataset and for records that are not in the dataset: the risk of the
+    latter is computed as if the record were published together with the dataset.
+
+    Attributes
+    ----------
+    dataset: numpy.array[IndividualRecord]
+        the reference dataset.
+    attack: Attack
+        the attack with which to compute the risks.
+    index: LocationIndex or SpatialGrid
+        the index used to find the records that can match an instance: the index of the attack on the dataset, see
+        Attack._frequency_index.
+    cache_size: int
+        the maximum number of instance supports kept in cache, None for no limit.
+    """
+
+    def __init__(self, dataset, attack, cache_size=None):
+        """
+        Initializer for the engine. Builds the indexes on the dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the reference dataset.
+        attack: Attack
+            the attack with which to compute the risks.
+        cache_size: int, optional
+            the maximum number of instance supports to keep in cache. The least recently used ones are discarded first.
+            If None (default) all the supports are kept.
+        """
+        self.dataset = dataset
+        self.attack = attack
+        self.cache_size = cache_size
+        self.index = attack._frequency_index(dataset)
+        self.__signatures = [attack._record_signature(individual_record) for individual_record in dataset]
+        self.__members = set(id(individual_record) for individual_record in dataset)
+        self.__positions = {}
+        for position, individual_record in enumerate(dataset):
+            self.__positions.setdefault(individual_record.id, []).append(position)
+        self.__supports = OrderedDict()
+        self.__evaluator = None
+
+    def support(self, instance):
+        """
+        Computes the support of a background knowledge instance in the reference dataset.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance of which to compute the support.
+
+        Returns
+        -------
+        support: int
+            the number of records of the dataset that match the instance.
+        """
+        key = (instance.dtype, instance.tobytes())
+        support = self.__supports.get(key)
+        if support is not None:
+            self.__supports.move_to_end(key)
+            return support
+        instance_signature = self.attack._instance_signature(instance)
+        support = 0
+        for position in self.__current_index().candidates(instance):
+            if self.attack._may_match(self.__signatures[position], instance_signature) and \
+                    self.attack.has_matching(self.dataset[position], instance):
+                support += 1
+        self.__store(key, support)
+        return support
+
+    def supports(self, instances):
+        """
+        Computes the supports of several background knowledge instances in the reference dataset. The distinct instances
+        that are not in cache are evaluated together, with a BatchEvaluator built on the dataset at the first call.
+
+        Parameters
+        ----------
+        instances: list[numpy.array[(x,y,i)]]
+            the background knowledge instances of which to compute the support.
+
+        Returns
+        -------
+        supports: list[int]
+            the number of records of the dataset that match each instance.
+        """
+        keys = [(instance.dtype, instance.tobytes()) for instance in instances]
+        found = {}
+        missing = {}
+        for key, instance in zip(keys, instances):
+            if key in found or key in missing:
+                continue
+            support = self.__supports.get(key)
+            if support is not None:
+                self.__supports.move_to_end(key)
+                found[key] = support
+            else:
+                missing[key] = instance
+        if missing:
+            if self.__evaluator is None:
+                self.__evaluator = BatchEvaluator(self.dataset, self.attack)
+            for key, support in zip(missing, self.__evaluator.supports(list(missing.values())).tolist()):
+                found[key] = support
+                self.__store(key, support)
+        return [found[key] for key in keys]
+
+    def risk(self, individual_record):
+        """
+        Computes the risk of reidentification of an individual. If the record is not part of the reference dataset, the
+        risk is computed as if the record were published together with the dataset.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record of the individual of which to compute the privacy risk.
+
+        Returns
+        -------
+        risk: float
+            the privacy risk of the individual owner of the individual_record.
+        """
+        supports = ((instance, self.support(instance)) for instance in self.attack.instances(individual_record))
+        return self.__risk(individual_record, supports)
+
+    def batch_risks(self, records):
+        """
+        Computes the risk of reidentification of several records together: the distinct instances of all the records
+        are collected, and their supports are computed at once, see supports. See risk.
+
+        Parameters
+        ----------
+        records: list[IndividualRecord]
+            the records of which to compute the privacy risk.
+
+        Returns
+        -------
+        risks: list[float]
+            the privacy risk of the individual owner of each record, in the same order.
+        """
+        record_instances = [list(self.attack.instances(individual_record)) for individual_record in records]
+        supports = self.supports([instance for instances in record_instances for instance in instances])
+        risks = []
+        start = 0
+        for individual_record, instances in zip(records, record_instances):
+            risks.append(self.__risk(individual_record, zip(instances, supports[start:start + len(instances)])))
+            start += len(instances)
+        return risks
+
+    def risks(self, records):
+        """
+        Computes the risk of reidentification of several individuals, with their supports computed together. See
+        batch_risks.
+
+        Parameters
+        ----------
+        records: list[IndividualRecord]
+            the records of the individuals of which to compute the privacy risk.
+
+        Returns
+        -------
+        risks: dict{int : float}
+            a dictionary with the identifier of each individual paired with her risk.
+        """
+        risks = {}
+        for individual_record, risk in zip(records, self.batch_risks(records)):
+            risks[individual_record.id] = risk
+        return risks
+
+    def risk_by_id(self, individual_id):
+        """
+        Computes the risk of reidentification of an individual of the reference dataset, given her identifier.
+
+        Parameters
+        ----------
+        individual_id: int
+            the identifier of the individual.
+
+        Returns
+        -------
+        risk: float
+            the privacy risk of the individual, None if she has no record in the dataset.
+        """
+        risk = None
+        for individual_record in self.records(individual_id):
+            record_risk = self.risk(individual_record)
+            if risk is None or record_risk > risk:
+                risk = record_risk
+        return risk
+
+    def records(self, individual_id):
+        """
+        Returns the records of an individual in the reference dataset.
+
+        Parameters
+        ----------
+        individual_id: int
+            the identifier of the individual.
+
+        Returns
+        -------
+        records: list[IndividualRecord]
+            the records of the individual.
+        """
+        return [self.dataset[position] for position in self.__positions.get(individual_id, [])]
+
+    def __risk(self, individual_record, supports):
+        """
+        Private function computing the risk of a record from the supports of its instances in the dataset, given as
+        (instance, support) pairs. The record is added to the supports if it is not part of the dataset.
+        """
+        published = id(individual_record) in self.__members
+        num_records = self.__current_index().id_counts.get(individual_record.id, 0)
+        if not published:
+            num_records += 1
+        risk = 0
+        for instance, support in supports:
+            if not published and self.attack.has_matching(individual_record, instance):
+                support += 1
+            prob = num_records / support
+            if prob > risk:
+                risk = prob
+        return risk
+
+    def __store(self, key, support):
+        """
+        Private function caching the support of an instance, discarding the least recently used one if the cache is
+        full.
+        """
+        self.__supports[key] = support
+        if self.cache_size is not None and len(self.__supports) > self.cache_size:
+            self.__supports.popitem(last=False)
+
+    def __current_index(self):
+        """
+        Private function returning the index of the attack on the reference dataset, building it again if the attack
+        was used on another dataset in the meantime.
+        """
+        if not self.index.indexes(self.dataset):
+            self.index = self.attack._frequency_index(self.dataset)
+        return self.index
@@ -0,0 +1,258 @@
+from pickle import dump, load
+from numpy import frombuffer
+from attacks import MATCHING_VERSION
+
+
+class IncrementalRisk:
+    """
+    Maintains the privacy risk of the individuals of a dataset that changes over time, for instance a dataset that is
+    published in daily snapshots. For each individual, only the background knowledge instance giving her risk (her best
+    instance) and its support are kept from one version of the dataset to the next. When records are inserted or
+    removed, the individuals owning them are computed again, and the risks of the other individuals are adjusted:
+
+    - an inserted record can only lower the risk of an individual, and only if it matches her best instance: such
+      individuals are computed again;
+    - a removed record can only raise the risk of an individual, through the instances of her records it matches: only
+      the supports of those instances are computed.
+
+    Either way the record shares a location with the records of the individual, so that only the individuals found
+    through the index of the dataset are examined. The state kept between two versions is thus made of a few values for
+    each individual: the records themselves are not kept, and are passed again at each update.
+
+    Attributes
+    ----------
+    attack: Attack
+        the attack with which the risks are computed.
+    best_instances: dict{int : bytes}
+        the raw bytes of the best instance of each individual, None for individuals whose records have no instance.
+    best_supports: dict{int : int}
+        the support of the best instance of each individual, None for individuals whose records have no instance.
+    id_counts: dict{int : int}
+        the number of records of each individual.
+    risks: dict{int : float}
+        the current risk of each individual.
+    """
+
+    def __init__(self, attack):
+        """
+        Initializer for the incremental risk computation.
+
+        Parameters
+        ----------
+        attack: Attack
+            the attack with which to compute the risks.
+        """
+        self.attack = attack
+        self.dtype = None
+        self.best_instances = {}
+        self.best_supports = {}
+        self.id_counts = {}
+        self.risks = {}
+
+    def fit(self, dataset):
+        """
+        Computes the risk of all individuals in the dataset from scratch, keeping the best instance of each individual
+        for later updates. Any previous state is discarded.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+
+        Returns
+        -------
+        risks: dict{int : float}
+            a dictionary with the identifier of each individual paired with her risk.
+        """
+        self.dtype = None
+        self.best_instances = {}
+        self.best_supports = {}
+        self.id_counts = {}
+        self.risks = {}
+        with self.attack._dataset_scope(dataset):
+            for individual_record in dataset:
+                self.id_counts[individual_record.id] = self.id_counts.get(individual_record.id, 0) + 1
+            for individual_id, records in self.__group_by_id(dataset, self.id_counts).items():
+                self.__compute(dataset, individual_id, records)
+        return dict(self.risks)
+
+    def update(self, dataset, inserted=(), removed=()):
+        """
+        Updates the risks after some records have been inserted in or removed from the dataset. An updated record is
+        passed as the removal of its old version and the insertion of its new one.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the new version of the dataset, already containing the inserted records and not the removed ones.
+        inserted: list[IndividualRecord]
+            the records inserted since the previous version.
+        removed: list[IndividualRecord]
+            the records removed since the previous version, as they were in the previous version.
+
+        Returns
+        -------
+        changed: dict{int : float}
+            the identifiers of the individuals whose risk changed, paired with their new risk. Individuals no longer in
+            the dataset are paired with None.
+        """
+        with self.attack._dataset_scope(dataset):
+            owners = set()
+            for individual_record in removed:
+                self.id_counts[individual_record.id] -= 1
+                if self.id_counts[individual_record.id] == 0:
+                    del self.id_counts[individual_record.id]
+                owners.add(individual_record.id)
+            for individual_record in inserted:
+                self.id_counts[individual_record.id] = self.id_counts.get(individual_record.id, 0) + 1
+                owners.add(individual_record.id)
+            recomputed = set(owners)
+            adjusted = set()
+            for individual_id in self.__neighbours(dataset, list(inserted) + list(removed)) - owners:
+                if self.best_instances.get(individual_id) is None:
+                    continue
+                best_instance = self.__instance(self.best_instances[individual_id])
+                if any(self.attack.has_matching(individual_record, best_instance) for individual_record in inserted):
+                    recomputed.add(individual_id)
+                elif removed:
+                    adjusted.add(individual_id)
+            old_risks = {individual_id: self.risks.get(individual_id) for individual_id in recomputed | adjusted}
+            records_by_id = self.__group_by_id(dataset, recomputed | adjusted)
+            for individual_id in recomputed:
+                if individual_id in records_by_id:
+                    self.__compute(dataset, individual_id, records_by_id[individual_id])
+                else:
+                    del self.risks[individual_id]
+                    del self.best_instances[individual_id]
+                    del self.best_supports[individual_id]
+            for individual_id in adjusted:
+                self.__adjust(dataset, individual_id, records_by_id[individual_id], removed)
+        changed = {}
+        for individual_id, old_risk in old_risks.items():
+            new_risk = self.risks.get(individual_id)
+            if new_risk != old_risk:
+                changed[individual_id] = new_risk
+        return changed
+
+    def save(self, filename):
+        """
+        Writes the state of the incremental computation to a file.
+
+        Parameters
+        ----------
+        filename: str
+            The name of the file to which to write the state.
+        """
+        state = {"attack": self.attack.describe(), "version": MATCHING_VERSION, "dtype": self.dtype,
+                 "best_instances": self.best_instances, "best_supports": self.best_supports,
+                 "id_counts": self.id_counts, "risks": self.risks}
+        with open(filename, "wb") as f:
+            dump(state, f)
+
+    @classmethod
+    def load(cls, filename, attack):
+        """
+        Reads the state of an incremental computation from a file written by save.
+
+        Parameters
+        ----------
+        filename: str
+            The name of the file from which to read the state.
+        attack: Attack
+            the attack with which the state was computed. ValueError is raised if its class or parameters differ
+            from the ones of the saved state, if the state was saved with a different MATCHING_VERSION, or if it was
+            saved in an older format.
+
+        Returns
+        -------
+        incremental: IncrementalRisk
+            the incremental computation, ready to be updated.
+        """
+        with open(filename, "rb") as f:
+            state = load(f)
+        if state.get("attack") != attack.describe() or state.get("version") != MATCHING_VERSION or \
+                "best_instances" not in state:
+            raise ValueError
+        incremental = cls(attack)
+        incremental.dtype = state["dtype"]
+        incremental.best_instances = state["best_instances"]
+        incremental.best_supports = state["best_supports"]
+        incremental.id_counts = state["id_counts"]
+        incremental.risks = state["risks"]
+        return incremental
+
+    def __key(self, instance):
+        """
+        Private function returning the key under which an instance is kept.
+        """
+        if self.dtype is None:
+            self.dtype = instance.dtype
+        return instance.astype(self.dtype).tobytes()
+
+    def __instance(self, key):
+        """
+        Private function rebuilding an instance from its key.
+        """
+        return frombuffer(key, dtype=self.dtype)
+
+    def __neighbours(self, dataset, records):
+        """
+        Private function returning the individuals of the dataset that have a record sharing a location with one of
+        the given records, as found by the index of the attack, and the individuals whose best instance has no visit,
+        which is matched by any record.
+        """
+        index = self.attack._frequency_index(dataset)
+        positions = set()
+        for individual_record in records:
+            for position in range(len(individual_record.visits)):
+                positions.update(index.candidates(individual_record.visits[position:position + 1]))
+        neighbours = set(dataset[position].id for position in positions)
+        for individual_id, key in self.best_instances.items():
+            if key is not None and len(key) == 0:
+                neighbours.add(individual_id)
+        return neighbours
+
+    def __compute(self, dataset, individual_id, records):
+        """
+        Private function computing the risk and the best instance of an individual from scratch.
+        """
+        risk, best_instance, best_support = 0, None, None
+        for individual_record in records:
+            record_risk, instance, support = self.attack.best_instance(dataset, individual_record)
+            if instance is not None and (best_instance is None or record_risk > risk):
+                risk, best_instance, best_support = record_risk, instance, support
+        self.risks[individual_id] = risk
+        self.best_instances[individual_id] = None if best_instance is None else self.__key(best_instance)
+        self.best_supports[individual_id] = best_support
+
+    def __adjust(self, dataset, individual_id, records, removed):
+        """
+        Private function raising the risk of an individual, whose best instance is not matched by any inserted record,
+        after some records were removed: the supports of the instances of her records matched by a removed record are
+        computed, and the other instances keep a probability not higher than her current risk.
+        """
+        num_records = self.id_counts[individual_id]
+        signatures = [self.attack._record_signature(individual_record) for individual_record in removed]
+        for individual_record in records:
+            for instance in self.attack.instances(individual_record):
+                instance_signature = self.attack._instance_signature(instance)
+                if not any(self.attack._may_match(signature, instance_signature) and
+                           self.attack.has_matching(removed_record, instance)
+                           for signature, removed_record in zip(signatures, removed)):
+                    continue
+                support = self.attack.support(dataset, instance)
+                if num_records / support > self.risks[individual_id]:
+                    self.risks[individual_id] = num_records / support
+                    self.best_instances[individual_id] = self.__key(instance)
+                    self.best_supports[individual_id] = support
+
+    @staticmethod
+    def __group_by_id(dataset, ids):
+        """
+        Private function grouping the records of the dataset belonging to the given individuals.
+        """
+        records_by_id = {}
+        for individual_record in dataset:
+            if individual_record.id in ids:
+                records_by_id.setdefault(individual_record.id, []).append(individual_record)
+        return records_by_id
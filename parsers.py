@@ -1,18 +1,52 @@
+from os.path import exists, getmtime
+from numpy import array, empty, argsort, int64
 from data_structures import *
 
+def __parse_line(line, width, integer_columns=()):
+    individual_id, _, values = line.partition(",")
+    # a record without visits has its identifier at the end of the line
+    individual_id = individual_id.rstrip("\r\n")
+    values = values.strip()
+    if values:
+        # converting the tokens raises ValueError on any token that is not a number
+        numbers = array(values.split(","), dtype=float)
+        if len(numbers) % width != 0:
+            raise ValueError
+    else:
+        numbers = empty(0)
+    rows = numbers.reshape(-1, width)
+    for column in integer_columns:
+        if (rows[:, column] % 1 != 0).any():
+            raise ValueError
+    return individual_id, rows
+
+
+def __insertion_order(keys):
+    # the order in which add_visit would keep the visits: sorted by key, the visits added later coming first among
+    # equal keys
+    reversed_order = argsort(keys[::-1], kind="stable")
+    return len(keys) - 1 - reversed_order
+
+
 def __read_trajectory_datetime(line):
-    itemlist = line.split(",")
-    trj = Trajectory(itemlist[0])
-    for i in range(1, len(itemlist), 3):
-        trj.add_visit(float(itemlist[i]), float(itemlist[i + 1]), int(itemlist[i + 2]))
+    individual_id, rows = __parse_line(line, 3, (2,))
+    trj = Trajectory(individual_id)
+    visits = empty(len(rows), dtype=trj.data_type)
+    visits["x"] = rows[:, 0]
+    visits["y"] = rows[:, 1]
+    visits["time"] = rows[:, 2]
+    trj.visits = visits[__insertion_order(visits["time"])]
     return trj
 
 
 def __read_trajectory_date_and_time(line):
-    itemlist = line.split(",")
-    trj = Trajectory(itemlist[0])
-    for i in range(1, len(itemlist), 4):
-        trj.add_visit(float(itemlist[i]), float(itemlist[i + 1]), int(itemlist[i + 2] + itemlist[i + 3]))
+    individual_id, rows = __parse_line(line, 4, (2, 3))
+    trj = Trajectory(individual_id)
+    visits = empty(len(rows), dtype=trj.data_type)
+    visits["x"] = rows[:, 0]
+    visits["y"] = rows[:, 1]
+    visits["time"] = rows[:, 2].astype(int64) * 1000000 + rows[:, 3].astype(int64)
+    trj.visits = visits[__insertion_order(visits["time"])]
     return trj
 
 
@@ -59,6 +93,30 @@ def read_trajectory_dataset_csv(filename):
     return trajectories
 
 
+def iter_trajectory_dataset_datetime(filename):
+    """
+    Lazily reads a Trajectory dataset from a textfile. The requested format for each row is:
+
+    userid,latitude 1,longitude 1,timestamp 1, ... , latitude n,longitude n,timestamp n
+    
+    Each row thus decribes the complete trajectory of an individual. Timestamps are single numbers.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the trajectories.
+        
+    Returns
+    -------
+    records: generator of Trajectory
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    with open(filename) as f:
+        for line in f:
+            yield __read_trajectory_datetime(line)
+
+
 def read_trajectory_dataset_datetime(filename):
     """
     Reads a Trajectory dataset from a textfile. The requested format for each row is:
@@ -77,11 +135,32 @@ def read_trajectory_dataset_datetime(filename):
     trafectories: Trajectory[]
         A list of trajectories read from the file.
     """
-    trajectories = []
+    return list(iter_trajectory_dataset_datetime(filename))
+
+
+def iter_trajectory_dataset_date_and_time(filename):
+    """
+    Lazily reads a Trajectory dataset from a textfile. The requested format for each row is:
+
+    userid,latitude 1,longitude 1,date 1,time 1, ... , latitude n,longitude n,date n,time n
+
+    Each row thus decribes the complete trajectory of an individual. Timestamps are divided in two numbers, one representing
+    the date and the other representing the time of the day.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the trajectories.
+    
+    Returns
+    -------
+    records: generator of Trajectory
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
     with open(filename) as f:
         for line in f:
-            trajectories.append(__read_trajectory_datetime(line))
-    return trajectories
+            yield __read_trajectory_date_and_time(line)
 
 
 def read_trajectory_dataset_date_and_time(filename):
@@ -103,11 +182,7 @@ def read_trajectory_dataset_date_and_time(filename):
     trafectories: Trajectory[]
         A list of trajectories read from the file.
     """
-    trajectories = []
-    with open(filename) as f:
-        for line in f:
-            trajectories.append(__read_trajectory_date_and_time(line))
-    return trajectories
+    return list(iter_trajectory_dataset_date_and_time(filename))
 
 
 def write_trajectory_dataset(trajectories, filename):
@@ -127,17 +202,44 @@ def write_trajectory_dataset(trajectories, filename):
     """
     with open(filename, "w+") as f:
         for tr in trajectories:
-            f.write(str(tr))
+            f.write(str(tr) + "\n")
 
 
 def __read_frequency_vector(line):
-    itemlist = line.split(",")
-    fv = FrequencyVector(itemlist[0])
-    for i in range(1, len(itemlist), 3):
-        fv.add_visit(float(itemlist[i]), float(itemlist[i + 1]), int(itemlist[i + 2]))
+    individual_id, rows = __parse_line(line, 3, (2,))
+    fv = FrequencyVector(individual_id)
+    visits = empty(len(rows), dtype=fv.data_type)
+    visits["x"] = rows[:, 0]
+    visits["y"] = rows[:, 1]
+    visits["freq"] = rows[:, 2]
+    fv.visits = visits[__insertion_order(-visits["freq"])]
     return fv
 
 
+def iter_frequency_vector_dataset(filename):
+    """
+    Lazily reads a Frequency Vector dataset from a text file. The requested format for each row is:
+
+    userid,latitude 1,longitude 1,frequency 1, ... ,latitude n,longitude n,frequency n
+
+    Each row is thus represents the complete frequency vector of an individual
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the frequency vectors.
+
+    Returns
+    -------
+    records: generator of FrequencyVector
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    with open(filename) as f:
+        for line in f:
+            yield __read_frequency_vector(line)
+
+
 def read_frequency_vector_dataset(filename):
     """
     Reads a Frequency Vector dataset from a text file. The requested format for each row is:
@@ -156,11 +258,7 @@ def read_frequency_vector_dataset(filename):
     frequency_vectors: FrequencyVector[]
         A list of frequency vectors read from the file.
     """
-    frequency_vectors = []
-    with open(filename) as f:
-        for line in f:
-            frequency_vectors.append(__read_frequency_vector(line))
-    return frequency_vectors
+    return list(iter_frequency_vector_dataset(filename))
 
 
 def read_frequency_vector_dataset_csv(filename):
@@ -191,7 +289,7 @@ def read_frequency_vector_dataset_csv(filename):
             individual_id = int(itemlist[0])
             fv = __find_record_by_id(frequency_vectors, individual_id)
             if fv is None:
-                vf = FrequencyVector(individual_id)
+                fv = FrequencyVector(individual_id)
                 frequency_vectors.append(fv)
             fv.add_visit(float(itemlist[1]), float(itemlist[2]), int(itemlist[3]))
     return frequency_vectors
@@ -214,14 +312,17 @@ def write_frequency_vector_dataset(frequency_vectors, filename):
     """
     with open(filename, "w+") as f:
         for fv in frequency_vectors:
-            f.write(str(fv))
+            f.write(str(fv) + "\n")
 
 
 def __read_probability_vector(line):
-    itemlist = line.split(",")
-    pv = ProbabilityVector(itemlist[0])
-    for i in range(1, len(itemlist), 3):
-        pv.add_visit(float(itemlist[i]), float(itemlist[i + 1]), float(itemlist[i + 2]))
+    individual_id, rows = __parse_line(line, 3)
+    pv = ProbabilityVector(individual_id)
+    visits = empty(len(rows), dtype=pv.data_type)
+    visits["x"] = rows[:, 0]
+    visits["y"] = rows[:, 1]
+    visits["prob"] = rows[:, 2]
+    pv.visits = visits[__insertion_order(-visits["prob"])]
     return pv
 
 
@@ -253,12 +354,36 @@ def read_probability_vector_dataset_csv(filename):
             individual_id = int(itemlist[0])
             pv = __find_record_by_id(probability_vectors, individual_id)
             if pv is None:
-                vf = FrequencyVector(individual_id)
+                pv = ProbabilityVector(individual_id)
                 probability_vectors.append(pv)
             pv.add_visit(float(itemlist[1]), float(itemlist[2]), float(itemlist[3]))
     return probability_vectors
 
 
+def iter_probability_vector_dataset(filename):
+    """
+    Lazily reads a Probability Vector dataset from a text file. The requested format for each row is:
+
+    userid,latitude 1,longitude 1,probability 1, ... ,latitude n,longitude n,probability n
+
+    Each row is thus represents the complete probability vector of an individual
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the probability vectors.
+
+    Returns
+    -------
+    records: generator of ProbabilityVector
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    with open(filename) as f:
+        for line in f:
+            yield __read_probability_vector(line)
+
+
 def read_probability_vector_dataset(filename):
     """
     Reads a Probability Vector dataset from a text file. The requested format for each row is:
@@ -277,11 +402,7 @@ def read_probability_vector_dataset(filename):
     probability_vectors: ProbabilityVector[]
         A list of probability vectors read from the file.
     """
-    probability_vectors = []
-    with open(filename) as f:
-        for line in f:
-            probability_vectors.append(__read_probability_vector(line))
-    return probability_vectors
+    return list(iter_probability_vector_dataset(filename))
 
 
 def write_probability_vector_dataset(probability_vectors, filename):
@@ -301,4 +422,192 @@ def write_probability_vector_dataset(probability_vectors, filename):
     """
     with open(filename, "w+") as f:
         for fv in probability_vectors:
-            f.write(str(fv))
+            f.write(str(fv) + "\n")
+
+
+def __iter_csv(filename, record_class, convert):
+    record = None
+    with open(filename) as f:
+        for line in f:
+            itemlist = line.split(",")
+            individual_id = int(itemlist[0])
+            if record is None or record.id != individual_id:
+                if record is not None:
+                    yield record
+                record = record_class(individual_id)
+            record.add_visit(float(itemlist[1]), float(itemlist[2]), convert(itemlist[3]))
+    if record is not None:
+        yield record
+
+
+def iter_trajectory_dataset_csv(filename):
+    """
+    Lazily reads a Trajectory dataset from a .csv file. The requested format for each row is:
+
+    userid,latitude,longitude,timestamp
+
+    Differently from read_trajectory_dataset_csv, the rows of each individual must be contiguous in the file, since
+    the trajectory of an individual is yielded as soon as a row of a different individual is read.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the trajectories.
+
+    Returns
+    -------
+    records: generator of Trajectory
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    return __iter_csv(filename, Trajectory, int)
+
+
+def iter_frequency_vector_dataset_csv(filename):
+    """
+    Lazily reads a Frequency Vector dataset from a .csv file. The requested format for each row is:
+
+    userid,latitude,longitude,frequency
+
+    Differently from read_frequency_vector_dataset_csv, the rows of each individual must be contiguous in the file,
+    since the frequency vector of an individual is yielded as soon as a row of a different individual is read.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the frequency vectors.
+
+    Returns
+    -------
+    records: generator of FrequencyVector
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    return __iter_csv(filename, FrequencyVector, int)
+
+
+def iter_probability_vector_dataset_csv(filename):
+    """
+    Lazily reads a Probability Vector dataset from a .csv file. The requested format for each row is:
+
+    userid,latitude,longitude,probability
+
+    Differently from read_probability_vector_dataset_csv, the rows of each individual must be contiguous in the file,
+    since the probability vector of an individual is yielded as soon as a row of a different individual is read.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file from which to read the probability vectors.
+
+    Returns
+    -------
+    records: generator of ProbabilityVector
+        The records read from the file, one at a time, in the order of the file. Only one record is kept in
+        memory at a time.
+    """
+    return __iter_csv(filename, ProbabilityVector, float)
+
+
+__line_readers = {
+    "trajectory_datetime": __read_trajectory_datetime,
+    "trajectory_date_and_time": __read_trajectory_date_and_time,
+    "frequency_vector": __read_frequency_vector,
+    "probability_vector": __read_probability_vector,
+}
+
+
+def build_offset_index(filename):
+    """
+    Builds the offset index of a dataset file with one row per individual, and writes it to a sidecar file named as
+    the dataset file followed by ".idx". Each row of the sidecar file is:
+
+    userid,offset
+
+    where offset is the position, in bytes, of the row of the individual in the dataset file.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the dataset file to index.
+
+    Returns
+    -------
+    index: dict{str : int}
+        The offset of the row of each individual, keyed by the identifier of the individual as written in the file.
+    """
+    index = {}
+    offset = 0
+    with open(filename, "rb") as f:
+        for line in f:
+            individual_id = line.split(b",", 1)[0].strip().decode()
+            if individual_id:
+                index[individual_id] = offset
+            offset += len(line)
+    with open(filename + ".idx", "w+") as f:
+        for individual_id, offset in index.items():
+            f.write(individual_id + "," + str(offset) + "\n")
+    return index
+
+
+def load_offset_index(filename):
+    """
+    Loads the offset index of a dataset file with one row per individual from its sidecar file. The sidecar file is
+    (re)built if it does not exist or if it is older than the dataset file.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the dataset file, not of the sidecar file.
+
+    Returns
+    -------
+    index: dict{str : int}
+        The offset of the row of each individual, keyed by the identifier of the individual as written in the file.
+    """
+    index_filename = filename + ".idx"
+    if not exists(index_filename) or getmtime(index_filename) < getmtime(filename):
+        return build_offset_index(filename)
+    index = {}
+    with open(index_filename) as f:
+        for line in f:
+            individual_id, offset = line.rsplit(",", 1)
+            index[individual_id] = int(offset)
+    return index
+
+
+def read_record_by_id(filename, individual_id, line_format, index=None):
+    """
+    Reads the record of a single individual from a dataset file with one row per individual, without reading the rest
+    of the file.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the dataset file.
+    individual_id: str or int
+        The identifier of the individual.
+    line_format: str
+        The format of the rows of the file: "trajectory_datetime", "trajectory_date_and_time", "frequency_vector" or
+        "probability_vector", as read by read_trajectory_dataset_datetime, read_trajectory_dataset_date_and_time,
+        read_frequency_vector_dataset and read_probability_vector_dataset respectively.
+    index: dict{str : int}, optional
+        The offset index of the file. If None, it is loaded with load_offset_index. Passing it avoids loading it at
+        every call.
+
+    Returns
+    -------
+    record: IndividualRecord
+        The record of the individual, None if the individual is not in the file.
+    """
+    if line_format not in __line_readers:
+        raise ValueError
+    if index is None:
+        index = load_offset_index(filename)
+    offset = index.get(str(individual_id))
+    if offset is None:
+        return None
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        line = f.readline().decode()
+    return __line_readers[line_format](line)
@@ -0,0 +1,133 @@
+from numpy import zeros, int64, asarray, histogram, cumsum, searchsorted, minimum, flatnonzero
+
+
+class RiskSummary:
+    """
+    Streaming summary of the privacy risks of a dataset. It is updated one risk (or one batch of risks) at a time and
+    never holds the risks themselves, so it can be kept while the risks are computed. Summaries computed on different
+    parts of a dataset can be merged.
+
+    The risks are counted in a histogram of equal-width bins over [0, 1], from which the quantiles are approximated. The
+    mean and the number of individuals with risk exactly 1 are exact. Risks above 1, which individuals with several
+    records may have, are counted in the last bin, so that the histogram always holds all the risks summarized: the
+    quantiles treat them as 1, and their number is kept apart.
+
+    Attributes
+    ----------
+    bins: int
+        the number of bins of the histogram.
+    counts: numpy.array[int]
+        the number of risks in each bin.
+    count: int
+        the number of risks summarized.
+    total: float
+        the sum of the risks summarized.
+    count_one: int
+        the number of risks equal to 1.
+    count_above: int
+        the number of risks greater than 1, counted in the last bin.
+    """
+
+    def __init__(self, bins=1000):
+        """
+        Initializer for the summary.
+
+        Parameters
+        ----------
+        bins: int
+            the number of bins of the histogram. More bins give more precise quantiles.
+        """
+        if bins < 1:
+            raise ValueError
+        self.bins = bins
+        self.counts = zeros(bins, dtype=int64)
+        self.count = 0
+        self.total = 0.0
+        self.count_one = 0
+        self.count_above = 0
+
+    def update(self, risks):
+        """
+        Adds risks to the summary.
+
+        Parameters
+        ----------
+        risks: float or numpy.array[float]
+            the risk, or the risks, to add.
+
+        Returns
+        -------
+        self: RiskSummary
+            the updated summary.
+        """
+        risks = asarray(risks, dtype=float).ravel()
+        self.counts += histogram(minimum(risks, 1.0), bins=self.bins, range=(0.0, 1.0))[0]
+        self.count += risks.size
+        self.total += float(risks.sum())
+        self.count_one += int((risks == 1).sum())
+        self.count_above += int((risks > 1).sum())
+        return self
+
+    def merge(self, other):
+        """
+        Adds to the summary the risks summarized by another summary, with the same number of bins.
+
+        Parameters
+        ----------
+        other: RiskSummary
+            the summary to merge.
+
+        Returns
+        -------
+        self: RiskSummary
+            the updated summary.
+        """
+        if other.bins != self.bins:
+            raise ValueError
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.count_one += other.count_one
+        self.count_above += other.count_above
+        return self
+
+    def mean(self):
+        """
+        Returns the mean of the risks, None if no risk was summarized.
+        """
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def quantile(self, q):
+        """
+        Approximates a quantile of the risks, interpolating linearly inside the bins of the histogram. The error is at
+        most the width of a bin, counting the risks above 1 as 1.
+
+        Parameters
+        ----------
+        q: float
+            the quantile to compute, between 0 and 1.
+
+        Returns
+        -------
+        value: float
+            the approximated quantile, None if no risk was summarized.
+        """
+        if q < 0 or q > 1:
+            raise ValueError
+        if self.count == 0:
+            return None
+        cumulative = cumsum(self.counts)
+        rank = q * self.count
+        # the lowest bins may be empty: the search starts from the first bin holding a risk
+        first = int(flatnonzero(self.counts)[0])
+        position = min(max(int(searchsorted(cumulative, rank, side="left")), first), self.bins - 1)
+        before = cumulative[position - 1] if position > 0 else 0
+        inside = self.counts[position]
+        fraction = (rank - before) / inside if inside > 0 else 0.0
+        return (position + fraction) / self.bins
+
+    def __repr__(self):
+        return "RiskSummary(count=" + str(self.count) + ", mean=" + str(self.mean()) + ", count_one=" + \
+            str(self.count_one) + ", count_above=" + str(self.count_above) + ")"
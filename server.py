@@ -0,0 +1,460 @@
+import asyncio
+from collections import deque
+from itertools import count
+from json import dumps, loads
+from time import perf_counter
+from numpy import array, percentile
+from data_structures import Trajectory, FrequencyVector, ProbabilityVector
+from engine import RiskEngine
+
+
+def encode_record(individual_record):
+    """
+    Encodes a record in the form accepted by RiskServer: a dictionary with the name of the class of the record
+    ("type"), its identifier ("id") and its visits as a list of [x, y, i] lists ("visits").
+
+    Parameters
+    ----------
+    individual_record: IndividualRecord
+        the record to encode.
+
+    Returns
+    -------
+    encoded: dict
+        the record, ready to be serialized to JSON.
+    """
+    individual_id = individual_record.id
+    if hasattr(individual_id, "item"):
+        individual_id = individual_id.item()
+    return {"type": type(individual_record).__name__, "id": individual_id,
+            "visits": [list(visit) for visit in individual_record.visits.tolist()]}
+
+
+def decode_record(encoded):
+    """
+    Decodes a record encoded by encode_record.
+
+    Parameters
+    ----------
+    encoded: dict
+        the encoded record.
+
+    Returns
+    -------
+    individual_record: IndividualRecord
+        the record.
+    """
+    record_types = {"Trajectory": Trajectory, "FrequencyVector": FrequencyVector,
+                    "ProbabilityVector": ProbabilityVector}
+    individual_record = record_types[encoded["type"]](encoded["id"])
+    for x, y, i in encoded["visits"]:
+        individual_record.add_visit(x, y, i)
+    return individual_record
+
+
+class RiskServer:
+    """
+    Local server answering risk queries against a reference dataset loaded once. The server keeps a RiskEngine for each
+    attack, so that the indexes of the dataset are built once and the supports of the instances are shared by all the
+    queries. It listens on a TCP socket or on a Unix socket, and speaks JSON lines: each line sent by a client is a
+    request, and gets a line with the response, carrying the same "id" as the request. Responses may come in a
+    different order than the requests.
+
+    A request is one of:
+
+    {"id": ..., "attack": name, "individual": identifier}
+        the risk of an individual of the reference dataset, null if she has no record.
+    {"id": ..., "attack": name, "record": encoded record}
+        the risk of a record encoded by encode_record, as if it were published together with the dataset if it is not
+        part of it.
+    {"id": ..., "op": "metrics"}
+        the metrics of the server, see metrics.
+
+    The response to a risk query has the risk in "risk", or the name of the error in "error" if the query can not be
+    answered. Queries arriving together, from the same or from different clients, are gathered in a batch of up to
+    max_batch queries, waiting at most batch_window seconds for the batch to fill, and the batch is evaluated at once:
+    identical queries are evaluated only once, and the records of all the queries of an attack are evaluated together,
+    see RiskEngine.batch_risks.
+
+    Attributes
+    ----------
+    engines: dict{str : RiskEngine}
+        the engine of each attack, by name.
+    max_batch: int
+        the maximum number of queries evaluated together.
+    batch_window: float
+        the maximum number of seconds a query waits for others to join its batch.
+    address: tuple(str, int) or str
+        the host and port, or the path of the Unix socket, on which the server listens, None if it is not started.
+    """
+
+    def __init__(self, dataset, attacks, names=None, max_batch=256, batch_window=0.002, cache_size=None):
+        """
+        Initializer for the server. Builds the engines of the attacks on the dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the reference dataset, for instance read with parsers.read_trajectory_dataset_datetime.
+        attacks: list[Attack]
+            the attacks with which to compute the risks.
+        names: list[str], optional
+            the names with which the attacks are requested. If None, the names are built with Attack.describe.
+        max_batch: int
+            the maximum number of queries to evaluate together.
+        batch_window: float
+            the maximum number of seconds a query waits for others to join its batch.
+        cache_size: int, optional
+            the maximum number of instance supports kept by each engine, see RiskEngine.
+        """
+        if names is None:
+            names = [attack.describe() for attack in attacks]
+        if len(names) != len(attacks) or len(set(names)) != len(names) or max_batch < 1 or batch_window < 0:
+            raise ValueError
+        self.engines = {name: RiskEngine(dataset, attack, cache_size) for name, attack in zip(names, attacks)}
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.address = None
+        self.__server = None
+        self.__queue = None
+        self.__batcher = None
+        self.__started = None
+        self.__requests = 0
+        self.__errors = 0
+        self.__batches = 0
+        self.__latencies = deque(maxlen=10000)
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """
+        Starts listening for clients.
+
+        Parameters
+        ----------
+        host: str
+            the host on which to listen, by default the local host only.
+        port: int
+            the TCP port on which to listen. If 0 (default) a free port is chosen, see address.
+        path: str, optional
+            if given, the server listens on a Unix socket with this path instead of on TCP.
+
+        Returns
+        -------
+        self: RiskServer
+            the server, listening.
+        """
+        self.__queue = asyncio.Queue()
+        self.__batcher = asyncio.ensure_future(self.__batch_loop())
+        if path is not None:
+            self.__server = await asyncio.start_unix_server(self.__serve_client, path=path)
+            self.address = path
+        else:
+            self.__server = await asyncio.start_server(self.__serve_client, host, port)
+            self.address = self.__server.sockets[0].getsockname()[:2]
+        self.__started = perf_counter()
+        return self
+
+    async def serve_forever(self):
+        """
+        Answers clients until the server is closed.
+        """
+        await self.__server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening and stops evaluating queries.
+        """
+        self.__server.close()
+        await self.__server.wait_closed()
+        self.__batcher.cancel()
+        try:
+            await self.__batcher
+        except asyncio.CancelledError:
+            pass
+        self.address = None
+
+    def evaluate(self, queries):
+        """
+        Evaluates a batch of risk queries. Identical queries are evaluated only once, and the records of the queries
+        made with the same attack, the given ones or the ones of the requested individuals, are evaluated together with
+        RiskEngine.batch_risks. If the evaluation of the records of an attack fails, its queries are evaluated one at a
+        time, so that only the failing ones get the error.
+
+        Parameters
+        ----------
+        queries: list[dict]
+            the queries, in the form of the requests received by the server.
+
+        Returns
+        -------
+        results: list[float or Exception]
+            the risk for each query, None for individuals without records, or the exception raised evaluating it.
+        """
+        evaluated = {}
+        pending = {}
+        keys = []
+        seen = set()
+        for query in queries:
+            key = dumps([query.get("attack"), query.get("individual"), query.get("record")], sort_keys=True)
+            keys.append(key)
+            if key in seen:
+                continue
+            seen.add(key)
+            try:
+                records = self.__records(query)
+            except Exception as error:
+                evaluated[key] = error
+            else:
+                pending.setdefault(query["attack"], {})[key] = records
+        for name, records_of in pending.items():
+            records = [individual_record for records in records_of.values() for individual_record in records]
+            try:
+                risks = self.engines[name].batch_risks(records)
+            except Exception:
+                for key, records in records_of.items():
+                    try:
+                        evaluated[key] = max(self.engines[name].batch_risks(records), default=None)
+                    except Exception as error:
+                        evaluated[key] = error
+                continue
+            start = 0
+            for key, records in records_of.items():
+                evaluated[key] = max(risks[start:start + len(records)], default=None)
+                start += len(records)
+        return [evaluated[key] for key in keys]
+
+    def __records(self, query):
+        """
+        Private function returning the records whose risk answers a query: the decoded record, or the records of the
+        individual in the reference dataset.
+        """
+        engine = self.engines[query["attack"]]
+        if "record" in query:
+            return [decode_record(query["record"])]
+        return engine.records(query["individual"])
+
+    def metrics(self):
+        """
+        Returns the metrics of the server.
+
+        Returns
+        -------
+        metrics: dict{str : float}
+            the number of risk queries answered ("requests"), of the ones that failed ("errors") and of the batches
+            evaluated ("batches"), the mean number of queries in a batch ("mean_batch_size"), the seconds since the
+            server started ("uptime"), the queries answered per second ("throughput") and the mean, median, 99th
+            percentile and maximum seconds taken to answer a query ("latency_mean", "latency_p50", "latency_p99",
+            "latency_max"), over the last 10000 queries.
+        """
+        uptime = perf_counter() - self.__started if self.__started is not None else 0.0
+        metrics = {"requests": self.__requests, "errors": self.__errors, "batches": self.__batches,
+                   "mean_batch_size": self.__requests / self.__batches if self.__batches > 0 else 0.0,
+                   "uptime": uptime, "throughput": self.__requests / uptime if uptime > 0 else 0.0}
+        latencies = array(self.__latencies, dtype=float)
+        if len(latencies) > 0:
+            metrics["latency_mean"] = float(latencies.mean())
+            metrics["latency_p50"] = float(percentile(latencies, 50))
+            metrics["latency_p99"] = float(percentile(latencies, 99))
+            metrics["latency_max"] = float(latencies.max())
+        else:
+            metrics.update(latency_mean=0.0, latency_p50=0.0, latency_p99=0.0, latency_max=0.0)
+        return metrics
+
+    async def __serve_client(self, reader, writer):
+        """
+        Private function reading the requests of a client. Each request is answered by its own task, so that the
+        requests of a client can be batched together.
+        """
+        answering = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.__answer(line, writer))
+                answering.add(task)
+                task.add_done_callback(answering.discard)
+            if answering:
+                await asyncio.gather(*answering)
+        finally:
+            writer.close()
+
+    async def __answer(self, line, writer):
+        """
+        Private function answering a request.
+        """
+        received = perf_counter()
+        try:
+            request = loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            request = {}
+            response = {"id": None, "error": "ValueError"}
+        else:
+            response = {"id": request.get("id")}
+            if request.get("op") == "metrics":
+                response["metrics"] = self.metrics()
+            else:
+                future = asyncio.get_running_loop().create_future()
+                await self.__queue.put((request, future))
+                result = await future
+                if isinstance(result, Exception):
+                    response["error"] = type(result).__name__
+                else:
+                    response["risk"] = result
+        if request.get("op") != "metrics":
+            self.__requests += 1
+            self.__errors += "error" in response
+            self.__latencies.append(perf_counter() - received)
+        writer.write((dumps(response) + "\n").encode())
+        await writer.drain()
+
+    async def __batch_loop(self):
+        """
+        Private function gathering the queries in batches and evaluating them, one batch at a time, outside of the
+        event loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.__queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                if not self.__queue.empty():
+                    batch.append(self.__queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.__queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            results = await loop.run_in_executor(None, self.evaluate, [query for query, _ in batch])
+            self.__batches += 1
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class RiskClient:
+    """
+    Client of a RiskServer. Requests can be sent concurrently on the same connection: each response is delivered to the
+    request with the same identifier.
+    """
+
+    def __init__(self, reader, writer):
+        """
+        Initializer for the client, on an open connection. Use connect to open one.
+
+        Parameters
+        ----------
+        reader: asyncio.StreamReader
+            the stream from which the responses are read.
+        writer: asyncio.StreamWriter
+            the stream to which the requests are written.
+        """
+        self.__reader = reader
+        self.__writer = writer
+        self.__identifiers = count()
+        self.__pending = {}
+        self.__receiver = asyncio.ensure_future(self.__receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=None, path=None):
+        """
+        Connects to a server.
+
+        Parameters
+        ----------
+        host: str
+            the host of the server.
+        port: int
+            the TCP port of the server.
+        path: str, optional
+            if given, the path of the Unix socket of the server, instead of host and port.
+
+        Returns
+        -------
+        client: RiskClient
+            the client, connected.
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def risk(self, attack, individual=None, record=None):
+        """
+        Queries the risk of an individual of the reference dataset, or of a record.
+
+        Parameters
+        ----------
+        attack: str
+            the name of the attack.
+        individual: int, optional
+            the identifier of the individual.
+        record: IndividualRecord, optional
+            the record, used instead of individual if given.
+
+        Returns
+        -------
+        risk: float
+            the risk, None if the individual has no record in the reference dataset.
+        """
+        request = {"attack": attack}
+        if record is not None:
+            request["record"] = encode_record(record)
+        else:
+            request["individual"] = individual
+        response = await self.__request(request)
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["risk"]
+
+    async def metrics(self):
+        """
+        Queries the metrics of the server, see RiskServer.metrics.
+        """
+        response = await self.__request({"op": "metrics"})
+        return response["metrics"]
+
+    async def close(self):
+        """
+        Closes the connection.
+        """
+        self.__writer.close()
+        await self.__writer.wait_closed()
+        self.__receiver.cancel()
+        try:
+            await self.__receiver
+        except asyncio.CancelledError:
+            pass
+
+    async def __request(self, request):
+        """
+        Private function sending a request and waiting for its response.
+        """
+        request["id"] = next(self.__identifiers)
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[request["id"]] = future
+        self.__writer.write((dumps(request) + "\n").encode())
+        await self.__writer.drain()
+        return await future
+
+    async def __receive(self):
+        """
+        Private function delivering the responses to the pending requests.
+        """
+        while True:
+            line = await self.__reader.readline()
+            if not line:
+                break
+            response = loads(line)
+            future = self.__pending.pop(response.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self.__pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError())
+        self.__pending.clear()
@@ -0,0 +1,319 @@
+from collections import defaultdict
+from numpy import floor, stack, int64
+
+
+class SpatialGrid:
+    """
+    Regular grid used to match locations with a spatial tolerance. Coordinates are quantized once into integer cells,
+    and a cell -> records index is kept for the dataset, so that candidate records for a background knowledge instance
+    are looked up through the neighbouring cells instead of scanning the whole dataset.
+
+    Two locations are considered the same if they fall in the same cell or in adjacent cells. Any two points closer than
+    cell_size along both coordinates will thus always match, while points up to twice cell_size apart may match.
+
+    Attributes
+    ----------
+    cell_size: float
+        the side of the square cells, in the same unit as the coordinates.
+    dataset: numpy.array[IndividualRecord]
+        the dataset currently indexed, None if no dataset has been indexed yet.
+    size: int
+        the number of records of the dataset when it was indexed.
+    id_counts: dict{int : int}
+        the number of records of each individual in the indexed dataset.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Initializer for the grid.
+
+        Parameters
+        ----------
+        cell_size: float
+            the side of the square cells. Should be strictly positive.
+        """
+        if cell_size <= 0:
+            raise ValueError
+        self.cell_size = cell_size
+        self.dataset = None
+        self.size = 0
+        self.id_counts = {}
+        self.__record_cells = {}
+        self.__cell_records = defaultdict(set)
+
+    def quantize(self, visits):
+        """
+        Maps the visits to the cells of the grid.
+
+        Parameters
+        ----------
+        visits: numpy.array[(x,y,i)]
+            the visits (or background knowledge instance) to quantize.
+
+        Returns
+        -------
+        cells: numpy.array
+            an integer array of shape (n, 2) with the cell coordinates of each visit.
+        """
+        cx = floor(visits["x"] / self.cell_size).astype(int64)
+        cy = floor(visits["y"] / self.cell_size).astype(int64)
+        return stack((cx, cy), axis=-1)
+
+    def indexes(self, dataset):
+        """
+        Checks whether the index is up to date with a dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset to check.
+
+        Returns
+        -------
+        indexes: bool
+            True if the dataset is the indexed one and has not changed size since it was indexed, False otherwise.
+        """
+        return self.dataset is dataset and self.size == len(dataset)
+
+    def index(self, dataset):
+        """
+        Quantizes all the records of the dataset and builds the cell -> records index. Any previously indexed dataset
+        is discarded.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset to index.
+
+        Returns
+        -------
+        self: SpatialGrid
+            the grid, indexing the dataset.
+        """
+        self.dataset = dataset
+        self.size = len(dataset)
+        self.id_counts = {}
+        self.__record_cells = {}
+        self.__cell_records = defaultdict(set)
+        for position, individual_record in enumerate(dataset):
+            cells = self.quantize(individual_record.visits).tolist()
+            self.__record_cells[id(individual_record)] = cells
+            for cell in cells:
+                self.__cell_records[tuple(cell)].add(position)
+            self.id_counts[individual_record.id] = self.id_counts.get(individual_record.id, 0) + 1
+        return self
+
+    def record_cells(self, individual_record):
+        """
+        Returns the cells of the visits of a record. The cells of the records of the indexed dataset are computed only
+        once, at indexing time.
+
+        Parameters
+        ----------
+        individual_record: IndividualRecord
+            the record of which to return the cells.
+
+        Returns
+        -------
+        cells: list[list[int]]
+            the cell coordinates of each visit of the record.
+        """
+        cells = self.__record_cells.get(id(individual_record))
+        if cells is None:
+            cells = self.quantize(individual_record.visits).tolist()
+        return cells
+
+    @staticmethod
+    def adjacent(cell_a, cell_b):
+        """
+        Checks whether two cells are the same cell or neighbouring cells.
+
+        Parameters
+        ----------
+        cell_a: list[int]
+            coordinates of the first cell.
+        cell_b: list[int]
+            coordinates of the second cell.
+
+        Returns
+        -------
+        adjacent: bool
+            True if the cells are at most one cell apart along both coordinates, False otherwise.
+        """
+        return abs(cell_a[0] - cell_b[0]) <= 1 and abs(cell_a[1] - cell_b[1]) <= 1
+
+    def neighbourhood(self, cell):
+        """
+        Returns the positions of the records of the indexed dataset with at least one visit in the cell or in one of
+        its neighbouring cells.
+
+        Parameters
+        ----------
+        cell: list[int]
+            coordinates of the cell.
+
+        Returns
+        -------
+        positions: set{int}
+            the positions in the dataset of the records close to the cell.
+        """
+        positions = set()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                positions |= self.__cell_records.get((cell[0] + dx, cell[1] + dy), set())
+        return positions
+
+    def frequency(self, x, y):
+        """
+        Returns the number of records of the indexed dataset visiting a location, up to the tolerance of the grid.
+
+        Parameters
+        ----------
+        x: float
+            first geographical coordinate of the location.
+        y: float
+            second geographical coordinate of the location.
+
+        Returns
+        -------
+        frequency: int
+            the number of records with at least one visit in the cell of the location or in a neighbouring cell.
+        """
+        return len(self.neighbourhood([int(floor(x / self.cell_size)), int(floor(y / self.cell_size))]))
+
+    def candidates(self, instance):
+        """
+        Returns the positions of the records of the indexed dataset that can match a background knowledge instance,
+        i.e. the records that have a visit close to every visit of the instance. Any record that is not returned can not
+        match the instance, whatever the attack.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        positions: list[int]
+            the positions in the dataset of the candidate records, in increasing order.
+        """
+        if len(instance) == 0:
+            return list(range(len(self.dataset)))
+        positions = None
+        for cell in self.quantize(instance).tolist():
+            close = self.neighbourhood(cell)
+            positions = close if positions is None else positions & close
+            if not positions:
+                break
+        return sorted(positions) if positions else []
+
+
+class LocationIndex:
+    """
+    Inverted index of the records of a dataset by exact location. It offers the same candidate lookup as SpatialGrid,
+    for attacks matching locations by exact equality of their coordinates.
+
+    Attributes
+    ----------
+    dataset: numpy.array[IndividualRecord]
+        the dataset currently indexed, None if no dataset has been indexed yet.
+    size: int
+        the number of records of the dataset when it was indexed.
+    id_counts: dict{int : int}
+        the number of records of each individual in the indexed dataset.
+    """
+
+    def __init__(self):
+        """
+        Initializer for the index.
+        """
+        self.dataset = None
+        self.size = 0
+        self.id_counts = {}
+        self.__location_records = defaultdict(set)
+
+    def indexes(self, dataset):
+        """
+        Checks whether the index is up to date with a dataset.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset to check.
+
+        Returns
+        -------
+        indexes: bool
+            True if the dataset is the indexed one and has not changed size since it was indexed, False otherwise.
+        """
+        return self.dataset is dataset and self.size == len(dataset)
+
+    def index(self, dataset):
+        """
+        Builds the location -> records index. Any previously indexed dataset is discarded.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset to index.
+
+        Returns
+        -------
+        self: LocationIndex
+            the index, indexing the dataset.
+        """
+        self.dataset = dataset
+        self.size = len(dataset)
+        self.id_counts = {}
+        self.__location_records = defaultdict(set)
+        for position, individual_record in enumerate(dataset):
+            visits = individual_record.visits
+            for location in zip(visits["x"].tolist(), visits["y"].tolist()):
+                self.__location_records[location].add(position)
+            self.id_counts[individual_record.id] = self.id_counts.get(individual_record.id, 0) + 1
+        return self
+
+    def frequency(self, x, y):
+        """
+        Returns the number of records of the indexed dataset visiting a location.
+
+        Parameters
+        ----------
+        x: float
+            first geographical coordinate of the location.
+        y: float
+            second geographical coordinate of the location.
+
+        Returns
+        -------
+        frequency: int
+            the number of records with at least one visit in the location.
+        """
+        return len(self.__location_records.get((x, y), ()))
+
+    def candidates(self, instance):
+        """
+        Returns the positions of the records of the indexed dataset that can match a background knowledge instance,
+        i.e. the records that visit every location of the instance. Any record that is not returned can not match the
+        instance, whatever the attack.
+
+        Parameters
+        ----------
+        instance: numpy.array[(x,y,i)]
+            the background knowledge instance.
+
+        Returns
+        -------
+        positions: list[int]
+            the positions in the dataset of the candidate records, in increasing order.
+        """
+        locations = set(zip(instance["x"].tolist(), instance["y"].tolist()))
+        if not locations:
+            return list(range(len(self.dataset)))
+        sets = sorted((self.__location_records.get(location, set()) for location in locations), key=len)
+        positions = set(sets[0])
+        for records in sets[1:]:
+            positions &= records
+            if not positions:
+                break
+        return sorted(positions)
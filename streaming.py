@@ -0,0 +1,130 @@
+from sys import getsizeof
+from numpy import frombuffer
+from spatial import LocationIndex, SpatialGrid
+
+
+def __record_bytes(individual_record):
+    """
+    Private function estimating the memory used by a record: the record object, its identifier and its visits.
+    """
+    return getsizeof(individual_record) + getsizeof(individual_record.id) + getsizeof(individual_record.visits)
+
+
+def __blocks(records, block_size, max_bytes):
+    """
+    Private function grouping the records read from a file into blocks of at most block_size records and, if max_bytes
+    is not None, of at most max_bytes bytes. A block always holds at least one record.
+    """
+    block = []
+    block_bytes = 0
+    for individual_record in records:
+        record_bytes = __record_bytes(individual_record)
+        if block and (len(block) == block_size or (max_bytes is not None and block_bytes + record_bytes > max_bytes)):
+            yield block
+            block = []
+            block_bytes = 0
+        block.append(individual_record)
+        block_bytes += record_bytes
+    if block:
+        yield block
+
+
+def __pending_batches(attack, records, block_size, max_bytes):
+    """
+    Private function generating the batches of pending instances: the records are read in order and their distinct
+    instances are collected until the batch holds block_size records or, if max_bytes is not None, its instances take
+    more than max_bytes bytes. A batch always holds the instances of at least one record.
+    Each batch is a pair: the list of (identifier, keys of the instances) of its records, and the dictionary of the
+    distinct instance keys of the batch, each paired with a support of 0.
+    """
+    owned = []
+    supports = {}
+    batch_bytes = 0
+    for individual_record in records:
+        kind = individual_record.visits.dtype
+        keys = list(dict.fromkeys((kind, instance.tobytes()) for instance in attack.instances(individual_record)))
+        record_bytes = sum(getsizeof(key[1]) for key in keys) + getsizeof(keys)
+        if owned and (len(owned) == block_size or (max_bytes is not None and batch_bytes + record_bytes > max_bytes)):
+            yield owned, supports
+            owned = []
+            supports = {}
+            batch_bytes = 0
+        owned.append((individual_record.id, keys))
+        for key in keys:
+            supports[key] = 0
+        batch_bytes += record_bytes
+    if owned:
+        yield owned, supports
+
+
+def __block_supports(attack, block, supports):
+    """
+    Private function adding to the supports of the pending instances the number of records of a block matching them.
+    """
+    if attack.grid is not None:
+        index = SpatialGrid(attack.grid.cell_size).index(block)
+    else:
+        index = LocationIndex().index(block)
+    signatures = [attack._record_signature(individual_record) for individual_record in block]
+    for key in supports:
+        instance = frombuffer(key[1], dtype=key[0])
+        instance_signature = attack._instance_signature(instance)
+        for position in index.candidates(instance):
+            if attack._may_match(signatures[position], instance_signature) and \
+                    attack.has_matching(block[position], instance):
+                supports[key] += 1
+
+
+def blockwise_all_risks(attack, filename, reader, block_size=1000, memory_budget=None, summary=None):
+    """
+    Computes privacy risk for all individuals of a dataset stored in a file, without ever loading the whole dataset in
+    memory. The dataset is read in blocks of records: the distinct instances of a batch of target records are kept
+    pending, the whole file is streamed past them one block at a time, adding up the number of records of each block
+    matching each instance, and the risks of the batch are computed from the final supports. The file is thus read
+    once more for each batch of target records.
+
+    Only the pending instances, one block of records and the number of records of each individual are kept in memory.
+
+    Parameters
+    ----------
+    attack: Attack
+        the attack with which to compute the risks.
+    filename: str
+        the name of the file holding the dataset.
+    reader: function
+        the function lazily reading the records of the file, for instance parsers.iter_trajectory_dataset_datetime.
+    block_size: int
+        the maximum number of records in a block, and of target records in a batch.
+    memory_budget: int, optional
+        the maximum number of bytes taken by the pending instances and by the block of records being streamed, half of
+        the budget going to each. Blocks and batches are cut short to stay within the budget, but always hold at least
+        one record. The budget is estimated from the size of the records and of the instances, and does not account
+        for the number of records of each individual. If None (default), only block_size bounds the memory.
+    summary: RiskSummary, optional
+        a summary updated with the risk of each record while the risks are computed.
+
+    Returns
+    -------
+    risk: dict{int : float}
+        a dictionary with the identifier of each individual paired with her risk, the highest among her records.
+    """
+    if block_size < 1 or (memory_budget is not None and memory_budget <= 0):
+        raise ValueError
+    half_budget = None if memory_budget is None else memory_budget // 2
+    id_counts = {}
+    for individual_record in reader(filename):
+        id_counts[individual_record.id] = id_counts.get(individual_record.id, 0) + 1
+    risks = {}
+    for owned, supports in __pending_batches(attack, reader(filename), block_size, half_budget):
+        for block in __blocks(reader(filename), block_size, half_budget):
+            __block_supports(attack, block, supports)
+        for individual_id, keys in owned:
+            risk = 0
+            for key in keys:
+                prob = id_counts[individual_id] / supports[key]
+                if prob > risk:
+                    risk = prob
+            if summary is not None:
+                summary.update(risk)
+            risks[individual_id] = max(risk, risks.get(individual_id, 0))
+    return risks
@@ -0,0 +1,149 @@
+from numpy import array, zeros
+from attacks import VisitAttack
+
+
+class AttackSuite:
+    """
+    Runs several attacks over the same dataset in a single pass. The structures needed by the attacks are built once
+    and shared: the locations of the dataset are interned into integer identifiers, the records are indexed by location
+    and, for each precision of the visit attacks, by location and time cut to that precision. The instances of a record
+    are generated once for all the attacks that would generate the same instances (for instance frequency attacks that
+    only differ in tolerance), and the records that can match an instance are looked up once for all the attacks.
+
+    Attributes
+    ----------
+    attacks: list[Attack]
+        the attacks to run.
+    names: list[str]
+        the name of each attack, used to label its risks.
+    """
+
+    def __init__(self, attacks, names=None):
+        """
+        Initializer for the suite.
+
+        Parameters
+        ----------
+        attacks: list[Attack]
+            the attacks to run.
+        names: list[str], optional
+            the name of each attack. If None, the names are built from the class and the parameters of the attacks, see
+            Attack.describe.
+        """
+        if names is None:
+            names = [attack.describe() for attack in attacks]
+        if len(names) != len(attacks) or len(set(names)) != len(names):
+            raise ValueError
+        self.attacks = attacks
+        self.names = names
+
+    def run(self, dataset):
+        """
+        Computes the privacy risk of all individuals in the dataset for every attack.
+
+        Parameters
+        ----------
+        dataset: numpy.array[IndividualRecord]
+            the dataset on which to calculate the risk.
+
+        Returns
+        -------
+        risks: dict{str : numpy.array}
+            a dictionary with the numpy array "id", with the identifier of each record of the dataset, and for each
+            attack, labelled by its name, the numpy array of the risks of the records in the same order.
+        """
+        self.__index(dataset)
+        groups = {}
+        for position, attack in enumerate(self.attacks):
+            groups.setdefault(self.__enumeration_key(attack), []).append(position)
+        risks = [zeros(len(dataset), dtype=float) for _ in self.attacks]
+        for record_position, individual_record in enumerate(dataset):
+            num_records = self.__id_counts[individual_record.id]
+            candidates_cache = {}
+            for positions in groups.values():
+                for instance in self.attacks[positions[0]].instances(individual_record):
+                    locations = self.__location_candidates(instance, candidates_cache)
+                    for position in positions:
+                        attack = self.attacks[position]
+                        attack._signatures(dataset)
+                        instance_signature = attack._instance_signature(instance)
+                        support = 0
+                        for candidate in self.__candidates(attack, dataset, instance, locations):
+                            if attack._may_match(attack._signature(dataset, candidate), instance_signature) and \
+                                    attack.has_matching(dataset[candidate], instance):
+                                support += 1
+                        prob = num_records / support
+                        if prob > risks[position][record_position]:
+                            risks[position][record_position] = prob
+        table = {"id": array([individual_record.id for individual_record in dataset])}
+        for name, attack_risks in zip(self.names, risks):
+            table[name] = attack_risks
+        return table
+
+    def __index(self, dataset):
+        """
+        Private function building the structures shared by the attacks: interned locations, the location -> records
+        index, the (location, cut time) -> records index for each precision of the visit attacks and the number of
+        records of each individual.
+        """
+        precisions = {}
+        for attack in self.attacks:
+            if isinstance(attack, VisitAttack):
+                precisions.setdefault(attack.precision, attack)
+        self.__location_ids = {}
+        self.__location_records = []
+        self.__visit_records = {precision: {} for precision in precisions}
+        self.__id_counts = {}
+        for record_position, individual_record in enumerate(dataset):
+            visits = individual_record.visits
+            location_ids = []
+            for location in zip(visits["x"].tolist(), visits["y"].tolist()):
+                location_id = self.__location_ids.setdefault(location, len(self.__location_ids))
+                if location_id == len(self.__location_records):
+                    self.__location_records.append(set())
+                self.__location_records[location_id].add(record_position)
+                location_ids.append(location_id)
+            for precision, attack in precisions.items():
+                times = attack._truncated_times(visits["time"].tolist())
+                for visit in zip(location_ids, times):
+                    self.__visit_records[precision].setdefault(visit, set()).add(record_position)
+            self.__id_counts[individual_record.id] = self.__id_counts.get(individual_record.id, 0) + 1
+
+    @staticmethod
+    def __enumeration_key(attack):
+        """
+        Private function identifying the attacks that generate the same instances from the same record.
+        """
+        parameters = tuple(getattr(attack, name, None) for name in ("precision", "window", "max_gap", "consecutive"))
+        return (type(attack), attack.k) + parameters
+
+    def __location_candidates(self, instance, cache):
+        """
+        Private function returning the positions of the records visiting every location of an instance. The results
+        are cached by set of locations, since several instances and attacks share them.
+        """
+        key = frozenset(zip(instance["x"].tolist(), instance["y"].tolist()))
+        if key not in cache:
+            sets = sorted((self.__location_records[self.__location_ids[location]] for location in key), key=len)
+            candidates = set(sets[0]) if sets else None
+            for records in sets[1:]:
+                candidates &= records
+            cache[key] = candidates
+        return cache[key]
+
+    def __candidates(self, attack, dataset, instance, locations):
+        """
+        Private function returning the positions of the records that can match an instance for an attack.
+        """
+        if attack.grid is not None:
+            return attack._candidate_index(dataset).candidates(instance)
+        if locations is None:
+            return range(len(dataset))
+        if isinstance(attack, VisitAttack):
+            visit_records = self.__visit_records[attack.precision]
+            times = attack._truncated_times(instance["time"].tolist())
+            candidates = locations
+            for location, time in zip(zip(instance["x"].tolist(), instance["y"].tolist()), times):
+                candidates = candidates & visit_records.get((self.__location_ids[location], time), set())
+            return candidates
+        return locations
@@ -0,0 +1,194 @@
+from collections import Counter
+from itertools import combinations
+from random import Random
+import pytest
+from attacks import Attack, LocationAttack, LocationSequenceAttack, VisitAttack
+from batch import BatchEvaluator
+from data_structures import Trajectory
+from distributed import partition, sharded_all_risks
+from parsers import write_trajectory_dataset, read_trajectory_dataset_datetime, iter_trajectory_dataset_datetime
+from streaming import blockwise_all_risks
+
+
+def trajectory(individual_id, locations):
+    trj = Trajectory(individual_id)
+    for position, (x, y) in enumerate(locations):
+        trj.add_visit(x, y, 20200101000000 + position)
+    return trj
+
+
+def test_location_attack_with_tolerance_does_not_depend_on_visit_order():
+    # (1.5, .5) is adjacent to both visits of record 0, (-0.5, .5) only to (0.5, .5): the first free visit is not
+    # always the right one
+    for locations in ([(1.5, .5), (-0.5, .5)], [(-0.5, .5), (1.5, .5)]):
+        dataset = [trajectory(0, [(0.5, .5), (2.5, .5)]), trajectory(1, locations)]
+        attack = LocationAttack(2, spatial_tolerance=1.0)
+        assert attack.has_matching(dataset[1], dataset[0].visits)
+        assert attack.all_risks(dataset) == {0: 0.5, 1: 0.5}
+        assert BatchEvaluator(dataset, LocationAttack(2, spatial_tolerance=1.0)).all_risks() == {0: 0.5, 1: 0.5}
+
+
+def test_location_attack_counts_repeated_locations():
+    attack = LocationAttack(2)
+    record = trajectory(0, [(1, 1), (2, 2)])
+    assert attack.has_matching(record, trajectory(1, [(1, 1), (2, 2)]).visits)
+    assert not attack.has_matching(record, trajectory(1, [(1, 1), (1, 1)]).visits)
+
+
+def test_sequence_attacks_reject_records_missing_the_last_visit():
+    record = trajectory(0, [(1, 1), (2, 2)])
+    instance = trajectory(1, [(1, 1), (3, 3)]).visits
+    assert not LocationSequenceAttack(2).has_matching(record, instance)
+    assert not VisitAttack(2, "Second").has_matching(record, instance)
+    assert LocationSequenceAttack(2).has_matching(record, record.visits)
+    assert VisitAttack(2, "Second").has_matching(record, record.visits)
+
+
+def test_risk_sees_records_changed_after_a_previous_call():
+    dataset = [trajectory(0, [(1, 1), (2, 2)]), trajectory(1, [(3, 3)])]
+    attack = LocationAttack(2)
+    assert attack.risk(dataset, dataset[0]) == 1.0
+    dataset[1] = trajectory(1, [(1, 1), (2, 2)])
+    assert attack.risk(dataset, dataset[0]) == 0.5
+    dataset[1].add_visit(4, 4, 20200102000000)
+    dataset[0].add_visit(4, 4, 20200102000000)
+    assert attack.risk(dataset, dataset[0]) == 0.5
+    assert attack.location_index is None
+
+
+def test_instances_are_generated_from_the_rarest_location():
+    common = [(1, 1), (2, 2), (3, 3)]
+    dataset = [trajectory(0, common + [(9, 9)])] + [trajectory(i, common) for i in range(1, 4)]
+    for attack in (LocationAttack(2), LocationSequenceAttack(2), VisitAttack(2, "Second")):
+        max_support, instance = next(attack._rarest_first(dataset, dataset[0]))
+        assert max_support == 1
+        assert (9, 9) in zip(instance["x"].tolist(), instance["y"].tolist())
+        assert (instance["time"][:-1] < instance["time"][1:]).all()
+        assert attack.risk(dataset, dataset[0]) == 1.0
+
+
+def shared_dataset():
+    locations = [(1, 1), (2, 2), (3, 3), (4, 4)]
+    return [trajectory(i, [locations[(i + j) % 4] for j in range(2 + i % 3)]) for i in range(10)]
+
+
+def test_sharded_and_blockwise_risks_equal_all_risks(tmp_path):
+    filename = str(tmp_path / "trajectories.txt")
+    write_trajectory_dataset(shared_dataset(), filename)
+    dataset = read_trajectory_dataset_datetime(filename)
+    shards = partition(dataset, 3)
+    shard_files = []
+    for position, shard in enumerate(shards):
+        shard_files.append(str(tmp_path / "shard{}.txt".format(position)))
+        write_trajectory_dataset(shard, shard_files[-1])
+    for attack in (LocationAttack(2), LocationSequenceAttack(2), VisitAttack(2, "Hour")):
+        risks = attack.all_risks(dataset)
+        assert sharded_all_risks(attack, shards, batch_size=4) == risks
+        assert sharded_all_risks(attack, shard_files, reader=read_trajectory_dataset_datetime) == risks
+        assert blockwise_all_risks(attack, filename, iter_trajectory_dataset_datetime, block_size=3) == risks
+
+
+def test_sharded_risks_raise_the_error_of_a_worker(tmp_path):
+    filename = str(tmp_path / "shard.txt")
+    write_trajectory_dataset(shared_dataset(), filename)
+    with pytest.raises(FileNotFoundError):
+        sharded_all_risks(LocationAttack(2), [filename, str(tmp_path / "missing.txt")],
+                          reader=read_trajectory_dataset_datetime)
+
+
+def test_windowed_instances_and_risks_match_a_brute_force_enumeration():
+    days = [[(1, 1, 80000), (2, 2, 83000), (3, 3, 100000), (1, 1, 103000)],
+            [(2, 2, 80500), (3, 3, 81000), (1, 1, 90000)],
+            [(1, 1, 80000), (3, 3, 120000), (2, 2, 123000), (3, 3, 124500)],
+            [(2, 2, 83000), (1, 1, 84500), (3, 3, 101500), (2, 2, 110000), (1, 1, 111500)]]
+    dataset = []
+    for individual_id, visits in enumerate(days):
+        trj = Trajectory(individual_id)
+        for x, y, time in visits:
+            trj.add_visit(x, y, 20200101000000 + time)
+        dataset.append(trj)
+
+    def symbols(visits, digits):
+        # the time of a visit cut to the precision of the attack, 0 for attacks ignoring time
+        times = [int(str(time)[:digits]) if digits else 0 for time in visits["time"].tolist()]
+        return list(zip(visits["x"].tolist(), visits["y"].tolist(), times))
+
+    def is_subsequence(instance, sequence):
+        remaining = iter(sequence)
+        return all(symbol in remaining for symbol in instance)
+
+    assert VisitAttack(2, "Hour")._truncated_times([20200101083000, 20200101235959]) == [2020010108, 2020010123]
+    for window, max_gap, consecutive in ((3600, None, False), (None, 1800, False), (None, None, True),
+                                         (7200, 3600, False), (5400, None, True)):
+        constraint = {"window": window, "max_gap": max_gap, "consecutive": consecutive}
+        for attack, digits in ((LocationSequenceAttack(2, **constraint), None),
+                               (LocationSequenceAttack(3, **constraint), None),
+                               (VisitAttack(2, "Hour", **constraint), 10),
+                               (VisitAttack(2, "Day", **constraint), 8)):
+            expected_risks = {}
+            for individual_record in dataset:
+                sequence = symbols(individual_record.visits, digits)
+                seconds = Attack._seconds(individual_record.visits["time"].tolist())
+                expected = set()
+                for positions in combinations(range(len(sequence)), min(attack.k, len(sequence))):
+                    if window is not None and seconds[positions[-1]] - seconds[positions[0]] > window:
+                        continue
+                    if max_gap is not None and any(seconds[b] - seconds[a] > max_gap
+                                                   for a, b in zip(positions, positions[1:])):
+                        continue
+                    if consecutive and positions[-1] - positions[0] != len(positions) - 1:
+                        continue
+                    expected.add(tuple(sequence[position] for position in positions))
+                generated = Counter(tuple(symbols(instance, digits))
+                                    for instance in attack.instances(individual_record))
+                assert generated == Counter(expected)
+                risk = 0
+                for instance in expected:
+                    support = sum(is_subsequence(instance, symbols(other.visits, digits)) for other in dataset)
+                    risk = max(risk, 1 / support)
+                expected_risks[individual_record.id] = risk
+            assert attack.all_risks(dataset) == expected_risks
+
+
+def test_signature_prefilter_never_drops_a_match():
+    # records with more distinct locations than signature bits, so that signature bits collide
+    generator = Random(7)
+    base = [(generator.randrange(40), generator.randrange(40)) for _ in range(300)]
+    dataset = []
+    for individual_id in range(8):
+        trj = Trajectory(individual_id)
+        for position, location in enumerate(base):
+            if generator.random() < 0.2:
+                location = (generator.randrange(40), generator.randrange(40))
+            trj.add_visit(location[0], location[1], 20200101000000 + (position // 24) * 1000000 + position % 24 * 10000)
+        dataset.append(trj)
+    assert all(len(set(zip(trj.visits["x"].tolist(), trj.visits["y"].tolist()))) > Attack.signature_bits
+               for trj in dataset)
+    for attack in (LocationAttack(3), LocationAttack(3, spatial_tolerance=2.0), LocationSequenceAttack(3),
+                   VisitAttack(3, "Hour"), VisitAttack(3, "Day", spatial_tolerance=2.0)):
+        signatures = [attack._record_signature(trj) for trj in dataset]
+        matches = 0
+        for _ in range(50):
+            positions = sorted(generator.sample(range(300), 3))
+            instance = dataset[generator.randrange(8)].visits[positions]
+            instance_signature = attack._instance_signature(instance)
+            for trj, signature in zip(dataset, signatures):
+                if attack.has_matching(trj, instance):
+                    matches += 1
+                    assert attack._may_match(signature, instance_signature)
+            assert attack.support(dataset, instance) == sum(attack.has_matching(trj, instance) for trj in dataset)
+        assert matches > 50
+
+
+def test_threshold_and_top_queries_agree_with_all_risks():
+    # many individuals share the same risk, so that ties are broken by the order of the dataset
+    dataset = shared_dataset() + [trajectory(10, [(5, 5)]), trajectory(11, [(1, 1), (2, 2)])]
+    for attack in (LocationAttack(2), LocationSequenceAttack(2), VisitAttack(2, "Hour"), LocationAttack(1)):
+        risks = attack.all_risks(dataset)
+        ranking = sorted(risks.items(), key=lambda item: -item[1])
+        assert len(set(risks.values())) < len(risks)
+        for K in range(len(dataset) + 2):
+            assert attack.top_risky(dataset, K) == ranking[:K]
+        for tau in [0, 1] + sorted(set(risks.values())):
+            assert attack.individuals_above(dataset, tau) == [individual_id for individual_id, risk in risks.items()
+                                                              if risk >= tau]
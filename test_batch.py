@@ -0,0 +1,67 @@
+from numpy import array
+from attacks import LocationAttack, LocationSequenceAttack, VisitAttack, FrequencyAttack, ProportionAttack, \
+    HomeWorkAttack
+from batch import BatchEvaluator
+from data_structures import Trajectory, FrequencyVector, ProbabilityVector
+
+
+def trajectories():
+    days = [[(1, 1), (2, 2), (1, 1), (3, 3)], [(2, 2), (1, 1), (3, 3)], [(1, 1), (3, 3), (2, 2)], [(4, 4), (2, 2)],
+            [(1, 1), (2, 2), (1, 1), (1, 1)]]
+    dataset = []
+    for individual_id, locations in enumerate(days):
+        trj = Trajectory(individual_id)
+        for position, (x, y) in enumerate(locations):
+            trj.add_visit(x, y, 20200101080000 + position * 10000 + individual_id % 2 * 100)
+        dataset.append(trj)
+    return dataset
+
+
+def vectors(record_class):
+    elements = [[(1, 1, 5), (2, 2, 3)], [(1, 1, 6), (2, 2, 4), (3, 3, 1)], [(1, 1, 5), (2, 2, 2)],
+                [(2, 2, 9), (1, 1, 2)], [(1, 1, 10), (2, 2, 3), (4, 4, 3)]]
+    dataset = []
+    for individual_id, visits in enumerate(elements):
+        vector = record_class(individual_id)
+        for x, y, value in visits:
+            vector.add_visit(x, y, value if record_class is FrequencyVector else value / 20)
+        dataset.append(vector)
+    return dataset
+
+
+def queries(attack, dataset, unseen):
+    instances = []
+    for individual_record in dataset:
+        instances.extend(attack.instances(individual_record))
+    # symbols never occurring in the dataset: a new location, a new time, more occurrences of a location than any
+    # record has, alone or together with known visits, and instances of different lengths in the same block
+    kind = dataset[0].visits.dtype
+    for visits in unseen:
+        instances.append(array(visits, dtype=kind))
+    return instances
+
+
+def test_batched_supports_and_risks_equal_the_ones_of_the_attack():
+    trajectory_queries = [[(9, 9, 20200101080000)], [(1, 1, 20200101080000), (9, 9, 20200101090000)],
+                          [(1, 1, 20300101080000), (2, 2, 20300101090000)],
+                          [(1, 1, 20200101080000), (1, 1, 20200101090000), (1, 1, 20200101100000),
+                           (1, 1, 20200101110000)]]
+    vector_queries = [[(9, 9, 1)], [(1, 1, 5), (9, 9, 1)], [(1, 1, 50), (2, 2, 1)]]
+    for dataset, attacks, unseen in (
+            (trajectories(), [LocationAttack(2), LocationAttack(3), LocationAttack(2, spatial_tolerance=1.0),
+                              LocationSequenceAttack(2), LocationSequenceAttack(3, window=7200),
+                              VisitAttack(2, "Hour"), VisitAttack(2, "Day"),
+                              VisitAttack(2, "Day", spatial_tolerance=1.0)],
+             trajectory_queries),
+            (vectors(FrequencyVector), [FrequencyAttack(2, 0.5), FrequencyAttack(1, 0.9), HomeWorkAttack(0.8),
+                                        ProportionAttack(2, 0.5)], vector_queries),
+            (vectors(ProbabilityVector), [FrequencyAttack.ProbabilityAttack(2, 0.0)],
+             [[(x, y, value / 20) for x, y, value in visits] for visits in vector_queries])):
+        for attack in attacks:
+            instances = queries(attack, dataset, unseen)
+            evaluator = BatchEvaluator(dataset, attack, block_size=3)
+            expected = [attack.support(dataset, instance) for instance in instances]
+            assert evaluator.supports(instances).tolist() == expected
+            assert expected[-len(unseen):].count(0) > 0
+            if type(attack) is not ProportionAttack:
+                assert evaluator.all_risks() == attack.all_risks(dataset)
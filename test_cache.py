@@ -0,0 +1,55 @@
+from os import utime
+from os.path import getmtime
+from attacks import LocationAttack, VisitAttack
+from cache import ResultCache
+from data_structures import Trajectory
+
+
+def dataset():
+    return [Trajectory(0).add_visit(1, 1, 20200101080000).add_visit(2, 2, 20200101090000),
+            Trajectory(1).add_visit(1, 1, 20200101083000).add_visit(3, 3, 20200101100000)]
+
+
+def test_repeated_computations_hit_the_cache(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    attack = LocationAttack(2)
+    risks = cache.all_risks(dataset(), attack)
+    assert risks == attack.all_risks(dataset())
+    # a stored entry is returned as it is, without computing the risks again
+    cache.put(dataset(), attack, {0: 0.25})
+    assert cache.all_risks(dataset(), LocationAttack(2)) == {0: 0.25}
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_changes_in_the_data_or_the_attack_miss_the_cache(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put(dataset(), VisitAttack(2, "Day"), {0: 0.25})
+    assert cache.get(dataset(), VisitAttack(2, "Day")) == {0: 0.25}
+    changed = dataset()
+    changed[1].add_visit(2, 2, 20200101110000)
+    assert cache.get(changed, VisitAttack(2, "Day")) is None
+    assert cache.get(dataset()[::-1], VisitAttack(2, "Day")) is None
+    for attack in (VisitAttack(2, "Hour"), VisitAttack(1, "Day"), VisitAttack(2, "Day", spatial_tolerance=1.0),
+                   VisitAttack(2, "Day", window=3600), LocationAttack(2)):
+        assert cache.get(dataset(), attack) is None
+    assert cache.all_risks(changed, VisitAttack(2, "Day")) == VisitAttack(2, "Day").all_risks(changed)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    attacks = [LocationAttack(1), LocationAttack(2), LocationAttack(3)]
+    cache = ResultCache(str(tmp_path))
+    cache.put(dataset(), attacks[0], {0: 0.5, 1: 0.5})
+    entry_size = cache.size()
+    cache = ResultCache(str(tmp_path), max_bytes=2 * entry_size)
+    cache.put(dataset(), attacks[1], {0: 0.5, 1: 0.5})
+    assert cache.size() == 2 * entry_size
+    # the first entry is older, but reading it makes the second one the least recently used
+    for age, attack in ((200, attacks[0]), (100, attacks[1])):
+        filename = str(tmp_path / (ResultCache.fingerprint(dataset(), attack) + ResultCache.suffix))
+        mtime = getmtime(filename) - age
+        utime(filename, (mtime, mtime))
+    assert cache.get(dataset(), attacks[0]) == {0: 0.5, 1: 0.5}
+    cache.put(dataset(), attacks[2], {0: 0.5, 1: 0.5})
+    assert cache.size() == 2 * entry_size
+    assert cache.get(dataset(), attacks[1]) is None
+    assert cache.get(dataset(), attacks[0]) is not None and cache.get(dataset(), attacks[2]) is not None
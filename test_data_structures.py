@@ -0,0 +1,29 @@
+import pytest
+from attacks import LocationAttack
+from data_structures import Trajectory, compact, intern_locations
+
+
+def test_compact_keeps_date_timestamps_by_default():
+    trj = Trajectory(0).add_visit(1.5, 2.5, 20200101120000)
+    compact([trj])
+    assert trj.visits["time"][0] == 20200101120000
+    assert trj.visits["x"].dtype == "float32"
+    with pytest.raises(ValueError):
+        compact([trj], time_dtype="uint32")
+
+
+def test_interned_locations_give_the_same_risks():
+    def dataset():
+        return [Trajectory(0).add_visit(1.5, 2.5, 20200101000000).add_visit(3.5, 4.5, 20200101010000),
+                Trajectory(1).add_visit(1.5, 2.5, 20200101000000).add_visit(5.5, 6.5, 20200101010000),
+                Trajectory(2).add_visit(3.5, 4.5, 20200101000000)]
+
+    interned = dataset()
+    locations = intern_locations(interned)
+    assert interned[0].visits["x"].dtype == "int32"
+    assert locations.tolist() == [[1.5, 2.5], [3.5, 4.5], [5.5, 6.5]]
+    assert interned[2].visits.tolist() == [(1, 0, 20200101000000)]
+    assert LocationAttack(1).all_risks(interned) == LocationAttack(1).all_risks(dataset())
+    extra = [Trajectory(3).add_visit(5.5, 6.5, 20200101000000).add_visit(7.5, 8.5, 20200101000000)]
+    locations = intern_locations(extra, locations=locations)
+    assert sorted(extra[0].visits["x"].tolist()) == [2, 3] and len(locations) == 4
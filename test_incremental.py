@@ -0,0 +1,44 @@
+import pytest
+from attacks import LocationAttack, VisitAttack
+from data_structures import Trajectory
+from incremental import IncrementalRisk
+
+
+def test_load_rejects_an_attack_with_different_parameters(tmp_path):
+    trj = Trajectory(0).add_visit(1, 1, 20200101000000).add_visit(2, 2, 20200101010000)
+    incremental = IncrementalRisk(VisitAttack(2, "Day"))
+    incremental.fit([trj])
+    filename = str(tmp_path / "state")
+    incremental.save(filename)
+    assert IncrementalRisk.load(filename, VisitAttack(2, "Day")).risks == incremental.risks
+    with pytest.raises(ValueError):
+        IncrementalRisk.load(filename, VisitAttack(2, "Hour"))
+    with pytest.raises(ValueError):
+        IncrementalRisk.load(filename, VisitAttack(2, "Day", spatial_tolerance=1.0))
+
+
+def test_update_matches_a_full_recomputation():
+    def trajectory(individual_id, locations):
+        trj = Trajectory(individual_id)
+        for position, (x, y) in enumerate(locations):
+            trj.add_visit(x, y, 20200101000000 + position)
+        return trj
+
+    def risks(attack, dataset):
+        result = {}
+        for individual_record in dataset:
+            risk = attack.risk(dataset, individual_record)
+            result[individual_record.id] = max(result.get(individual_record.id, 0), risk)
+        return result
+
+    attack = LocationAttack(2)
+    dataset = [trajectory(0, [(1, 1), (2, 2)]), trajectory(1, [(1, 1), (2, 2), (3, 3)]),
+               trajectory(2, [(2, 2), (3, 3)]), trajectory(3, [(4, 4), (5, 5)])]
+    incremental = IncrementalRisk(attack)
+    assert incremental.fit(dataset) == risks(attack, dataset)
+    assert set(incremental.best_instances) == {0, 1, 2, 3}
+    # removing 1 raises the risks of 0 and 2, inserting a copy of 3 lowers the risk of 3
+    inserted = [trajectory(4, [(4, 4), (5, 5)])]
+    new_dataset = [dataset[0], dataset[2], dataset[3]] + inserted
+    assert incremental.update(new_dataset, inserted, [dataset[1]]) == {0: 1.0, 1: None, 2: 1.0, 3: 0.5, 4: 0.5}
+    assert incremental.risks == risks(attack, new_dataset)
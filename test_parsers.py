@@ -0,0 +1,83 @@
+from os import utime
+from os.path import getmtime
+import pytest
+from data_structures import Trajectory, FrequencyVector
+from parsers import read_trajectory_dataset_datetime, read_frequency_vector_dataset, iter_trajectory_dataset_datetime, \
+    iter_frequency_vector_dataset, read_trajectory_dataset_csv, iter_trajectory_dataset_csv, write_trajectory_dataset, \
+    write_frequency_vector_dataset, build_offset_index, load_offset_index, read_record_by_id
+
+
+def test_lines_with_bad_values_are_rejected(tmp_path):
+    filename = tmp_path / "trajectories.txt"
+    filename.write_text("u1,1.5,2.5,20200101000000,x,2.5,20200101010000\n")
+    with pytest.raises(ValueError):
+        read_trajectory_dataset_datetime(str(filename))
+    filename.write_text("u1,1.5,2.5,3,4.5\n")
+    with pytest.raises(ValueError):
+        read_frequency_vector_dataset(str(filename))
+
+
+def test_lines_are_read_in_visit_order(tmp_path):
+    filename = tmp_path / "trajectories.txt"
+    filename.write_text("u1,1.5,2.5,20200101010000,3.5,4.5,20200101000000\nu2\n")
+    first, second = read_trajectory_dataset_datetime(str(filename))
+    assert first.id == "u1" and first.visits.tolist() == [(3.5, 4.5, 20200101000000), (1.5, 2.5, 20200101010000)]
+    assert len(second.visits) == 0
+
+
+def test_integer_fields_must_hold_integers(tmp_path):
+    filename = tmp_path / "vectors.txt"
+    filename.write_text("u1,1.5,2.5,3.7\n")
+    with pytest.raises(ValueError):
+        read_frequency_vector_dataset(str(filename))
+    filename.write_text("u1,1.5,2.5,3\n")
+    assert read_frequency_vector_dataset(str(filename))[0].visits.tolist() == [(1.5, 2.5, 3)]
+
+
+def trajectories():
+    return [Trajectory(1).add_visit(1.5, 2.5, 20200101000000).add_visit(3.5, 4.5, 20200101010000),
+            Trajectory(2).add_visit(3.5, 4.5, 20200102000000),
+            Trajectory(3)]
+
+
+def test_lazy_readers_match_the_eager_ones(tmp_path):
+    filename = str(tmp_path / "trajectories.txt")
+    write_trajectory_dataset(trajectories(), filename)
+    eager = read_trajectory_dataset_datetime(filename)
+    lazy = iter_trajectory_dataset_datetime(filename)
+    assert iter(lazy) is lazy
+    assert [(r.id, r.visits.tolist()) for r in lazy] == [(r.id, r.visits.tolist()) for r in eager]
+    assert [r.visits.tolist() for r in eager] == [r.visits.tolist() for r in trajectories()]
+    filename = str(tmp_path / "vectors.txt")
+    write_frequency_vector_dataset([FrequencyVector(1).add_visit(1.5, 2.5, 3).add_visit(3.5, 4.5, 7)], filename)
+    assert [r.visits.tolist() for r in iter_frequency_vector_dataset(filename)] == \
+        [r.visits.tolist() for r in read_frequency_vector_dataset(filename)]
+    filename = tmp_path / "trajectories.csv"
+    filename.write_text("1,1.5,2.5,20200101000000\n1,3.5,4.5,20200101010000\n2,3.5,4.5,20200102000000\n")
+    assert [(r.id, r.visits.tolist()) for r in iter_trajectory_dataset_csv(str(filename))] == \
+        [(r.id, r.visits.tolist()) for r in read_trajectory_dataset_csv(str(filename))]
+
+
+def test_offset_index_round_trip(tmp_path):
+    filename = str(tmp_path / "trajectories.txt")
+    write_trajectory_dataset(trajectories(), filename)
+    index = build_offset_index(filename)
+    assert set(index) == {"1", "2", "3"}
+    assert load_offset_index(filename) == index
+    for trajectory in trajectories():
+        record = read_record_by_id(filename, trajectory.id, "trajectory_datetime", index)
+        assert record.id == str(trajectory.id) and record.visits.tolist() == trajectory.visits.tolist()
+    assert read_record_by_id(filename, 4, "trajectory_datetime", index) is None
+    with pytest.raises(ValueError):
+        read_record_by_id(filename, 1, "unknown", index)
+
+
+def test_missing_or_stale_offset_index_is_rebuilt(tmp_path):
+    filename = str(tmp_path / "trajectories.txt")
+    write_trajectory_dataset(trajectories(), filename)
+    assert read_record_by_id(filename, 2, "trajectory_datetime").visits.tolist() == [(3.5, 4.5, 20200102000000)]
+    # the dataset is rewritten with the rows in another order, after the sidecar file
+    write_trajectory_dataset(trajectories()[::-1], filename)
+    utime(filename + ".idx", (getmtime(filename) - 10, getmtime(filename) - 10))
+    assert read_record_by_id(filename, 2, "trajectory_datetime").visits.tolist() == [(3.5, 4.5, 20200102000000)]
+    assert load_offset_index(filename)["3"] == 0
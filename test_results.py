@@ -0,0 +1,18 @@
+from results import RiskSummary
+
+
+def test_summary_counts_risks_above_one():
+    summary = RiskSummary(bins=10).update([0.25, 1.0, 2.0, 2.0])
+    assert summary.counts.sum() == summary.count == 4
+    assert summary.count_one == 1
+    assert summary.count_above == 2
+    assert summary.mean() == 1.3125
+    assert summary.quantile(0.25) == 0.3
+    assert summary.quantile(1.0) == 1.0
+
+
+def test_lowest_quantile_skips_empty_bins():
+    summary = RiskSummary(bins=10).update([0.55, 0.65, 0.95])
+    assert 0.5 <= summary.quantile(0) <= 0.55
+    assert 0.5 <= summary.quantile(0.2) <= 0.6
+    assert summary.quantile(1.0) == 1.0
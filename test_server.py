@@ -0,0 +1,30 @@
+from attacks import LocationAttack, VisitAttack
+from data_structures import Trajectory
+from engine import RiskEngine
+from server import RiskServer, encode_record
+
+
+def trajectory(individual_id, locations):
+    trj = Trajectory(individual_id)
+    for position, (x, y) in enumerate(locations):
+        trj.add_visit(x, y, 20200101000000 + position * 1000000)
+    return trj
+
+
+def test_batched_queries_match_single_queries():
+    dataset = [trajectory(0, [(1, 1), (2, 2), (3, 3)]), trajectory(1, [(1, 1), (2, 2)]),
+               trajectory(1, [(2, 2), (4, 4)]), trajectory(2, [(3, 3), (4, 4), (5, 5)])]
+    attacks = [LocationAttack(2), VisitAttack(2, "Day")]
+    server = RiskServer(dataset, attacks, names=["location", "visit"])
+    outsider = trajectory(3, [(1, 1), (4, 4)])
+    queries = [{"attack": name, "individual": individual} for name in ("location", "visit") for individual in range(4)]
+    queries += [{"attack": "location", "record": encode_record(outsider)}, {"attack": "location", "individual": 1},
+                {"attack": "nope", "individual": 0}]
+    results = server.evaluate(queries)
+    for name, attack in (("location", LocationAttack(2)), ("visit", VisitAttack(2, "Day"))):
+        engine = RiskEngine(dataset, attack)
+        for individual in range(4):
+            assert results[queries.index({"attack": name, "individual": individual})] == engine.risk_by_id(individual)
+    assert results[8] == RiskEngine(dataset, LocationAttack(2)).risk(outsider)
+    assert results[9] == results[1]
+    assert isinstance(results[10], KeyError)
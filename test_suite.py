@@ -0,0 +1,53 @@
+from attacks import LocationAttack, LocationSequenceAttack, VisitAttack, FrequencyAttack, HomeWorkAttack
+from data_structures import Trajectory, FrequencyVector
+from suite import AttackSuite
+
+
+def trajectories():
+    days = [[(1, 1), (2, 2), (3, 3), (1, 1)], [(2, 2), (3, 3), (1, 1)], [(1, 1), (3, 3), (2, 2), (3, 3)],
+            [(2, 2), (1, 1), (3, 3), (2, 2), (1, 1)], [(4, 4), (2, 2)], [(1, 1), (2, 2), (3, 3), (1, 1)]]
+    dataset = []
+    for individual_id, locations in enumerate(days):
+        # the last record belongs to the same individual as the first one
+        trj = Trajectory(individual_id % 5)
+        for position, (x, y) in enumerate(locations):
+            trj.add_visit(x, y, 20200101080000 + position * 10000 + individual_id * 100)
+        dataset.append(trj)
+    return dataset
+
+
+def frequency_vectors():
+    visits = [[(1, 1, 5), (2, 2, 3)], [(1, 1, 6), (2, 2, 4), (3, 3, 1)], [(1, 1, 5), (2, 2, 2)], [(2, 2, 9), (1, 1, 2)],
+              [(1, 1, 10), (2, 2, 3)]]
+    dataset = []
+    for individual_id, elements in enumerate(visits):
+        vector = FrequencyVector(individual_id)
+        for x, y, frequency in elements:
+            vector.add_visit(x, y, frequency)
+        dataset.append(vector)
+    return dataset
+
+
+def test_suite_risks_equal_the_risks_of_each_attack():
+    for dataset, attacks in ((trajectories(), [LocationAttack(2), LocationAttack(2, spatial_tolerance=1.0),
+                                               LocationSequenceAttack(2), LocationSequenceAttack(3, window=7200),
+                                               VisitAttack(2, "Hour"), VisitAttack(2, "Day"),
+                                               VisitAttack(2, "Day", consecutive=True)]),
+                             (frequency_vectors(), [FrequencyAttack(2, 0.5), FrequencyAttack(2, 0.9),
+                                                    FrequencyAttack(1, 0.9)])):
+        suite = AttackSuite(attacks)
+        table = suite.run(dataset)
+        assert table["id"].tolist() == [individual_record.id for individual_record in dataset]
+        for attack, name in zip(attacks, suite.names):
+            assert table[name].tolist() == [attack.risk(dataset, individual_record) for individual_record in dataset]
+
+
+def test_description_changes_with_every_parameter():
+    attacks = [LocationAttack(2), LocationAttack(3), LocationAttack(2, spatial_tolerance=1.0),
+               LocationSequenceAttack(2), LocationSequenceAttack(2, window=3600), LocationSequenceAttack(2, max_gap=60),
+               LocationSequenceAttack(2, consecutive=True), VisitAttack(2, "Hour"), VisitAttack(2, "Day"),
+               VisitAttack(2, "Day", window=3600), FrequencyAttack(2, 0.5), FrequencyAttack(2, 0.9),
+               HomeWorkAttack(0.5), HomeWorkAttack(0.9)]
+    descriptions = [attack.describe() for attack in attacks]
+    assert len(set(descriptions)) == len(descriptions)
+    assert LocationAttack(2).describe() == LocationAttack(2).describe()